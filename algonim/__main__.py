@@ -1,90 +1,139 @@
-import importlib.util
+import sys
+from argparse import ArgumentParser, ArgumentTypeError
 from pathlib import Path
 
-import imageio
-import numpy as np
-import pyglet
-from PIL import Image
+from algonim.headless import has_display, use_headless
 
-from algonim.script import ScriptExecutor, write_script
-from algonim.time_utils import Timer
-from algonim.window import AppWindow
 
+def parse_frames(value: str) -> range:
+    start, stop = value.split(":")
+    return range(int(start), int(stop))
 
-def load_script(path: Path):
-    spec = importlib.util.spec_from_file_location("videoscript", path)
 
-    if spec is None or spec.loader is None:
-        raise RuntimeError(f"Cannot load script from {path}")
+def positive_int(value: str) -> int:
+    n = int(value)
+    if n < 1:
+        raise ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
 
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-
-    if not hasattr(module, "build_script"):
-        raise RuntimeError(f"{path} must define build_script(window)")
-
-    return module.build_script
-
-
-def exec_preview(script_exec: ScriptExecutor):
-    script_exec.start()
-    pyglet.app.run()
-
-
-def exec_video_renderer(
-    window: AppWindow,
-    script_exec: ScriptExecutor,
-    target_fps: int,
-):
-    fixed_dt = 1 / target_fps
-    buffer = pyglet.image.get_buffer_manager().get_color_buffer()
-    writer = imageio.get_writer(
-        "output.mp4", fps=target_fps, codec="libx264", quality=8
-    )
-
-    with Timer("render_frames"):
-        window.switch_to()
-
-        while not script_exec.is_complete():
-            script_exec.execute_current_action(fixed_dt)
-
-            window.clear()
-            window.dispatch_events()
-            window.dispatch_event("on_draw")
-
-            # To show preview in OS window, window without `double_buffer`
-            # should use it over `flip`
-            pyglet.gl.glFlush()
-
-            raw = buffer.get_image_data().get_data("RGBA", window.width * 4)
-            img = Image.frombytes("RGBA", (window.width, window.height), raw)
-            img = img.transpose(
-                Image.Transpose.FLIP_TOP_BOTTOM
-            )  # Opengl stores image upside down
-
-            writer.append_data(np.array(img))
-
-    window.set_visible(False)
-    writer.close()
-
-
-if __name__ == "__main__":
-    from argparse import ArgumentParser
 
+def main():
     parser = ArgumentParser("algonim")
-    parser.add_argument("script", help="Path to video script")
-    parser.add_argument("--video", action="store_true")
-    parser.add_argument("--headless", action="store_true")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    preview_parser = commands.add_parser("preview", help="Play script in a window")
+    preview_parser.add_argument("script", help="Path to video script")
+
+    render_parser = commands.add_parser("render", help="Render script to a video")
+    render_parser.add_argument("script", help="Path to video script")
+    render_parser.add_argument("-o", "--output", default="output.mp4")
+    render_parser.add_argument("--headless", action="store_true")
+    render_parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="Overlap drawing, readback and encoding",
+    )
+    render_parser.add_argument(
+        "--resolution",
+        choices=["native", "360p", "720p", "fullhd", "4k"],
+        help="Output size, the script keeps its 1920x1080 coordinates",
+    )
+    render_parser.add_argument(
+        "--supersample",
+        type=int,
+        choices=[1, 2, 4],
+        default=1,
+        help="Render at 2 or 4 times the output size and downsample on the "
+        "GPU, halving it at each step",
+    )
+    render_parser.add_argument(
+        "--draft",
+        action="store_true",
+        help="Fast preview render: 360p, 15 fps, ultrafast encoder preset",
+    )
+    render_parser.add_argument(
+        "--profile",
+        metavar="TRACE_JSON",
+        help="Write per-frame stage timings as a Chrome trace",
+    )
+    render_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=1,
+        help="Render time ranges in N worker processes and join them",
+    )
+    render_parser.add_argument(
+        "--frames",
+        type=parse_frames,
+        metavar="START:STOP",
+        help="Render only this frame range, split across --jobs workers",
+    )
 
-    args = parser.parse_args()
+    # `python -m algonim script.py` is a shortcut for preview
+    argv = sys.argv[1:]
+    if argv[:1] not in (["preview"], ["render"], ["-h"], ["--help"]):
+        argv = ["preview", *argv]
+    args = parser.parse_args(argv)
+
+    is_render = args.command == "render"
+    headless = is_render and (args.headless or not has_display())
+    if is_render and args.profile is not None and args.jobs > 1:
+        # Workers are separate processes, the trace would hold only the concat
+        render_parser.error("--profile can't be combined with --jobs")
+    if headless:
+        use_headless()
+
+    # Imported only now: pyglet picks its GL backend on first import
+    from algonim.render import (
+        RESOLUTIONS,
+        RenderSettings,
+        exec_pipelined_renderer,
+        exec_preview,
+        exec_video_renderer,
+        load_script,
+    )
+    from algonim.script import write_script
+    from algonim.segments import render_segments
+    from algonim.window import AppWindow
 
     # Type ignore here is a bug in pyglet typing
-    window = AppWindow(visible=not args.headless, double_buffer=not args.video)  # type: ignore[abstract]
+    window = AppWindow(visible=not headless, double_buffer=not is_render)  # type: ignore[abstract]
     build_script = load_script(Path(args.script))
 
     script_exec = write_script(window, build_script)
 
-    if not args.video:
+    if not is_render:
         exec_preview(script_exec)
+        return
+
+    settings = RenderSettings(
+        output=args.output,
+        supersample=args.supersample,
+        frames=args.frames,
+        trace=args.profile,
+    )
+    if args.draft:
+        settings = settings.as_draft()
+    if args.resolution is not None:
+        settings.resolution = RESOLUTIONS.get(args.resolution)
+
+    if args.jobs > 1:
+        window.set_visible(False)
+        frames = settings.frame_range(script_exec)
+        worker_args = ["--headless", f"--supersample={args.supersample}"]
+        if args.resolution is not None:
+            worker_args.append(f"--resolution={args.resolution}")
+        if args.draft:
+            worker_args.append("--draft")
+        if args.pipelined:
+            worker_args.append("--pipelined")
+        render_segments(args.script, frames, args.jobs, args.output, worker_args)
+    elif args.pipelined:
+        exec_pipelined_renderer(window, script_exec, settings)
     else:
-        exec_video_renderer(window, script_exec, target_fps=60)
+        exec_video_renderer(window, script_exec, settings)
+
+
+if __name__ == "__main__":
+    main()
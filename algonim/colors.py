@@ -1,3 +1,5 @@
+from algonim.easing import lerp
+
 type Color = tuple[int, int, int, int]
 """RGBA Color, each component [0..255]"""
 
@@ -5,7 +7,14 @@ WHITE = (255, 255, 255, 255)
 TRANSPARENT = (255, 255, 255, 0)
 GREY = (222, 222, 222, 255)
 BLACK = (0, 0, 0, 255)
+HIGHLIGHT = (255, 179, 67, 255)
 
 
 def replace_alpha(color, alpha):
     return (*color[:3], alpha)
+
+
+def mix(a: Color, b: Color, t: float) -> Color:
+    """Color `t` of the way from `a` to `b`"""
+    red, green, blue, alpha = (round(lerp(x, y, t)) for x, y in zip(a, b, strict=True))
+    return (red, green, blue, alpha)
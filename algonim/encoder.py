@@ -0,0 +1,166 @@
+import os
+import queue
+import subprocess
+import threading
+from contextlib import nullcontext
+
+from imageio_ffmpeg import get_ffmpeg_exe
+
+from algonim.time_utils import FrameProfiler
+
+
+class FFmpegWriter:
+    """Pipes raw RGBA frames straight into an ffmpeg subprocess
+
+    Frames are expected bottom row first, as OpenGL reads them, ffmpeg's
+    `vflip` filter puts them upright. No intermediate images are created.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        width: int,
+        height: int,
+        fps: int,
+        crf: int = 10,
+        preset: str = "medium",
+    ):
+        self.frame_size = width * height * 4
+        cmd = [
+            get_ffmpeg_exe(),
+            "-y",
+            "-v",
+            "warning",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "rgba",
+            "-s",
+            f"{width}x{height}",
+            "-r",
+            str(fps),
+            "-i",
+            "-",
+            "-an",
+            "-vf",
+            "vflip",
+            "-c:v",
+            "libx264",
+            "-preset",
+            preset,
+            "-crf",
+            str(crf),
+            "-pix_fmt",
+            "yuv420p",
+            path,
+        ]
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        assert self.process.stdin is not None
+        self.stdin = self.process.stdin
+
+    def write(self, frame: bytes | bytearray | memoryview):
+        self.stdin.write(frame)
+
+    def close(self):
+        self.stdin.close()
+        returncode = self.process.wait()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {returncode}")
+
+
+class EncoderThread(threading.Thread):
+    """Feeds frames to a writer from a background thread
+
+    Frames live in a fixed pool of preallocated buffers: `acquire` a buffer,
+    fill it, `submit` it, and it returns to the pool once a newer frame is
+    written. The pool is bounded, so a renderer that outpaces the encoder
+    blocks instead of buffering the whole video in memory.
+    """
+
+    def __init__(
+        self,
+        writer: FFmpegWriter,
+        frame_size: int,
+        max_queued: int = 8,
+        profiler: FrameProfiler | None = None,
+    ):
+        super().__init__(name="algonim-encoder", daemon=True)
+        self.writer = writer
+        self.profiler = profiler
+        self.queue: queue.Queue[bytearray | None] = queue.Queue()
+        self.free: queue.Queue[bytearray] = queue.Queue()
+        for _ in range(max_queued):
+            self.free.put(bytearray(frame_size))
+        self.error: BaseException | None = None
+        self.last_submitted: bytearray | None = None
+
+    def run(self):
+        # The latest frame stays out of the pool, so it can be repeated
+        last = None
+        while (frame := self.queue.get()) is not None:
+            # Keep draining on error, so `acquire` never blocks forever
+            if self.error is None:
+                try:
+                    with self.stage("encode"):
+                        self.writer.write(frame)
+                except BaseException as e:
+                    self.error = e
+            if last is not None and last is not frame:
+                self.free.put(last)
+            last = frame
+
+    def stage(self, name: str):
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.stage(name)
+
+    def acquire(self) -> bytearray:
+        return self.free.get()
+
+    def submit(self, frame: bytearray):
+        if self.error is not None:
+            raise RuntimeError("Encoder thread failed") from self.error
+        self.queue.put(frame)
+        self.last_submitted = frame
+
+    def repeat(self):
+        """Write the last submitted frame once more"""
+        assert self.last_submitted is not None
+        self.submit(self.last_submitted)
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+        self.writer.close()
+        if self.error is not None:
+            raise RuntimeError("Encoder thread failed") from self.error
+
+
+def concat_videos(paths: list[str], output: str):
+    """Join videos with identical encoding settings without re-encoding"""
+    list_path = f"{output}.concat.txt"
+    with open(list_path, "w") as f:
+        for path in paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+
+    try:
+        subprocess.run(
+            [
+                get_ffmpeg_exe(),
+                "-y",
+                "-v",
+                "warning",
+                "-f",
+                "concat",
+                "-safe",
+                "0",
+                "-i",
+                list_path,
+                "-c",
+                "copy",
+                output,
+            ],
+            check=True,
+        )
+    finally:
+        os.remove(list_path)
@@ -0,0 +1,105 @@
+from itertools import pairwise
+
+from pyglet import gl
+from pyglet.image.buffer import Framebuffer, Renderbuffer
+
+
+def create_framebuffer(width: int, height: int) -> tuple[Framebuffer, Renderbuffer]:
+    color = Renderbuffer(width, height, gl.GL_RGBA8)
+    framebuffer = Framebuffer()
+    framebuffer.attach_renderbuffer(color)
+
+    framebuffer.bind()
+    status = framebuffer.get_status()
+    complete = framebuffer.is_complete
+    framebuffer.unbind()
+    if not complete:
+        raise RuntimeError(f"Framebuffer incomplete: {status}")
+
+    return framebuffer, color
+
+
+SUPERSAMPLE_FACTORS = (1, 2, 4)
+
+
+class OffscreenTarget:
+    """Offscreen framebuffer objects to render video frames into
+
+    Doesn't depend on the window's default framebuffer, which may be hidden,
+    obscured, or (in headless mode) a tiny EGL pbuffer.
+
+    Output resolution is independent of the window: the scene is drawn with
+    the window's projection, stretched over a `width * supersample` by
+    `height * supersample` framebuffer. With supersampling, frames are
+    downsampled on the GPU before readback, halved at each step, so
+    `supersample` must be a power of 2.
+    """
+
+    def __init__(self, width: int, height: int, supersample: int = 1):
+        if supersample not in SUPERSAMPLE_FACTORS:
+            raise ValueError(
+                f"supersample must be one of {SUPERSAMPLE_FACTORS}, got {supersample}"
+            )
+        self.width = width
+        self.height = height
+        self.render_width = width * supersample
+        self.render_height = height * supersample
+
+        scales = [supersample]
+        while scales[-1] > 1:
+            scales.append(scales[-1] // 2)
+        self.sizes = [(width * scale, height * scale) for scale in scales]
+        """Sizes of the framebuffers from the drawn one down to the output"""
+        self.targets = [create_framebuffer(*size) for size in self.sizes]
+        self.framebuffer, self.color = self.targets[0]
+        self.output, self.output_color = self.targets[-1]
+
+    def bind(self):
+        """Draw into this target"""
+        self.framebuffer.bind()
+        gl.glViewport(0, 0, self.render_width, self.render_height)
+
+    def resolve(self):
+        """Finish the frame, leaves the output bound for readback"""
+        targets = zip(self.targets, self.sizes, strict=True)
+        for (source, source_size), (dest, dest_size) in pairwise(targets):
+            gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, source[0].id)
+            gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, dest[0].id)
+            # Linear filtering over an exact 2x2 block is a box filter, any
+            # other ratio skips samples
+            gl.glBlitFramebuffer(
+                0,
+                0,
+                *source_size,
+                0,
+                0,
+                *dest_size,
+                gl.GL_COLOR_BUFFER_BIT,
+                gl.GL_LINEAR,
+            )
+        self.output.bind()
+
+    def unbind(self):
+        self.output.unbind()
+
+    def blit_to_window(self, width: int, height: int):
+        """Copy the resolved frame to the window, to watch a render in progress"""
+        gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, 0)
+        gl.glBlitFramebuffer(
+            0,
+            0,
+            self.width,
+            self.height,
+            0,
+            0,
+            width,
+            height,
+            gl.GL_COLOR_BUFFER_BIT,
+            gl.GL_LINEAR,
+        )
+        self.output.bind()
+
+    def delete(self):
+        for framebuffer, color in self.targets:
+            framebuffer.delete()
+            color.delete()
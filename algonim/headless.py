@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pyglet
+
+
+def has_display() -> bool:
+    if not sys.platform.startswith("linux"):
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def use_headless():
+    """Render through EGL, without a display server
+
+    Uses the GPU if there is one, otherwise Mesa's software rasterizer.
+    Must be called before `pyglet.gl` or `pyglet.window` is imported, pyglet
+    picks its backends on import.
+    """
+    if "pyglet.gl" in sys.modules:
+        raise RuntimeError("use_headless() must be called before pyglet.gl import")
+    pyglet.options["headless"] = True
@@ -1,148 +1,324 @@
+import numbers
+
 import pyglet
-from pyglet import shapes
+from pyglet import gl
+from pyglet.text.layout import TextLayoutGroup
+
+from algonim.colors import HIGHLIGHT, TRANSPARENT, WHITE, Color, mix
+from algonim.easing import ease_in_out_cubic, ease_linear
+from algonim.primitives.group import GroupActor
+from algonim.script import Action, Tween, defer, instant, parallel, seq
+from algonim.shaders import ShapeGroup, shape_program, text_program
+from algonim.traced_containers import Op
+
+RECT_VERTICES = 6
+"""Two triangles per rectangle"""
+QUAD_INDICES = (0, 1, 2, 0, 2, 3)
+DIGITS = "-0123456789"
+"""Every glyph a cell can show"""
+
+
+def rectangle(x0, y0, x1, y1) -> tuple[float, ...]:
+    return (x0, y0, x1, y0, x1, y1, x0, y0, x1, y1, x0, y1)
+
 
-from algonim.colors import TRANSPARENT, WHITE, replace_alpha
+def cell_value(value) -> int:
+    """`value` checked to be an integer, the only values cells have glyphs for"""
+    if isinstance(value, bool) or not isinstance(value, numbers.Integral):
+        raise ValueError(f"Array cells hold integers, got {value!r}")
+    return int(value)
 
 
-class Array:
-    def __init__(self, x, y, data: list[int], thickness: float = 5.0):
-        self.x = x
-        self.y = y
-        self.time = 0
+def write_region(vertex_list, name: str, first: int, data):
+    """Overwrite `name` from vertex `first` on, only that range is uploaded"""
+    buffer = vertex_list.domain.attrib_name_buffers[name]
+    buffer.set_region(vertex_list.start + first, len(data) // buffer.count, data)
 
-        n = len(data)
-        self.data = data
+
+class Array(GroupActor):
+    """Row of cells with a number in each
+
+    The grid and the cell backgrounds are one vertex list, the digits of all
+    cells are glyph quads in another. Per-cell operations rewrite only the
+    vertices of the cells they touch.
+    """
+
+    def __init__(
+        self, x, y, data: list[int], thickness: float = 5.0, font_size: int = 36
+    ):
+        super().__init__(x, y)
+        self.data = [cell_value(value) for value in data]
         self.entry_size = 100
         self.thickness = thickness
+        self.color: Color = WHITE
+        self.cell_colors: list[Color] = [TRANSPARENT] * len(data)
 
-        width = n * self.entry_size
-        height = self.entry_size
+        self.font = pyglet.font.load(None, font_size)
+        glyphs = self.font.get_glyphs(DIGITS)
+        self.texture = glyphs[0].owner
+        # Every digit quad is drawn with this one texture
+        if any(glyph.owner is not self.texture for glyph in glyphs):
+            raise RuntimeError(
+                f"Digit glyphs of {self.font} landed on several textures"
+            )
+        # Glyph quads reserved per cell, grows when a longer value is set
+        self.slots = max((len(str(value)) for value in data), default=1)
 
-        left_bottom_x = x - width / 2
-        left_bottom_y = y - height / 2
+        self.batch: pyglet.graphics.Batch | None = None
+        self.grid = None
+        self.digits = None
+        self.set_alpha(0)
 
-        self.left_border = shapes.Line(
-            x=left_bottom_x,
-            y=left_bottom_y,
-            x2=left_bottom_x,
-            y2=left_bottom_y + self.entry_size,
-            width=thickness,
-            color=WHITE,
-        )
-        self.right_border = shapes.Line(
-            x=left_bottom_x + self.entry_size * n,
-            y=left_bottom_y,
-            x2=left_bottom_x + self.entry_size * n,
-            y2=left_bottom_y + self.entry_size,
-            width=thickness,
-            color=WHITE,
+    def attach(self, batch, group):
+        super().attach(batch, group)
+        self.batch = batch
+        self.create_grid()
+        self.create_digits()
+
+    @property
+    def left(self) -> float:
+        # Local coordinates, centered on (x, y)
+        return -len(self.data) * self.entry_size / 2
+
+    def cell_x(self, i: int) -> float:
+        return self.left + self.entry_size * i
+
+    def grid_positions(self) -> list[float]:
+        """Cell backgrounds first, so the borders are drawn over them"""
+        n = len(self.data)
+        size = self.entry_size
+        half = self.thickness / 2
+        bottom = -size / 2
+        top = size / 2
+        right = self.cell_x(n)
+
+        positions: list[float] = []
+        for i in range(n):
+            positions.extend(rectangle(self.cell_x(i), bottom, self.cell_x(i + 1), top))
+        for i in range(n + 1):
+            x = self.cell_x(i)
+            positions.extend(rectangle(x - half, bottom, x + half, top))
+        for y in (bottom, top):
+            positions.extend(
+                rectangle(self.left - half, y - half, right + half, y + half)
+            )
+        return positions
+
+    def create_grid(self):
+        if self.grid is not None:
+            self.grid.delete()
+
+        program = shape_program()
+        n = len(self.data)
+        count = (2 * n + 3) * RECT_VERTICES
+        colors = [c for color in self.cell_colors for c in color * RECT_VERTICES]
+        colors.extend(self.color * (count - n * RECT_VERTICES))
+        self.grid = program.vertex_list(
+            count,
+            gl.GL_TRIANGLES,
+            self.batch,
+            ShapeGroup(program, parent=self.transform),
+            position=("f", self.grid_positions()),
+            colors=("Bn", colors),
+            translation=("f", (0, 0) * count),
+            rotation=("f", (0,) * count),
         )
-        self.bottom_border = shapes.Line(
-            x=left_bottom_x - thickness / 2,
-            y=left_bottom_y,
-            x2=left_bottom_x + self.entry_size * n + thickness / 2,
-            y2=left_bottom_y,
-            width=thickness,
-            color=WHITE,
+
+    def cell_glyphs(self, i: int) -> tuple[list[float], list[float]]:
+        """Positions and texture coordinates of the quads in cell `i`
+
+        Laid out exactly as a center-anchored Label would, unused quads are
+        left empty.
+        """
+        glyphs = self.font.get_glyphs(str(self.data[i]))
+        width = sum(glyph.advance for glyph in glyphs)
+        x = self.cell_x(i) + self.entry_size / 2 - width // 2
+        ascent = self.font.ascent
+        y = ascent // 2 - self.font.descent // 4
+
+        positions: list[float] = []
+        tex_coords: list[float] = []
+        pen = 0
+        for glyph in glyphs:
+            gx0, gy0, gx1, gy1 = glyph.vertices
+            x0 = round(gx0 + pen) + x
+            x1 = round(gx1 + pen) + x
+            y0 = round(gy0 - ascent) + y
+            y1 = round(gy1 - ascent) + y
+            positions.extend((x0, y0, 0, x1, y0, 0, x1, y1, 0, x0, y1, 0))
+            tex_coords.extend(glyph.tex_coords)
+            pen += glyph.advance
+
+        unused = (self.slots - len(glyphs)) * 12
+        positions.extend((0,) * unused)
+        tex_coords.extend((0,) * unused)
+        return positions, tex_coords
+
+    def create_digits(self):
+        if self.digits is not None:
+            self.digits.delete()
+
+        program = text_program()
+        n = len(self.data)
+        quads = n * self.slots
+        count = quads * 4
+        positions: list[float] = []
+        tex_coords: list[float] = []
+        for i in range(n):
+            cell_positions, cell_tex_coords = self.cell_glyphs(i)
+            positions.extend(cell_positions)
+            tex_coords.extend(cell_tex_coords)
+
+        self.digits = program.vertex_list_indexed(
+            count,
+            gl.GL_TRIANGLES,
+            [q * 4 + index for q in range(quads) for index in QUAD_INDICES],
+            self.batch,
+            TextLayoutGroup(self.texture, program, order=1, parent=self.transform),
+            position=("f", positions),
+            colors=("Bn", self.color * count),
+            tex_coords=("f", tex_coords),
+            translation=("f", (0, 0, 0) * count),
+            view_translation=("f", (0, 0, 0) * count),
+            anchor=("f", (0, 0) * count),
+            rotation=("f", (0,) * count),
+            visible=("f", (1,) * count),
         )
-        self.top_border = shapes.Line(
-            x=left_bottom_x - thickness / 2,
-            y=left_bottom_y + self.entry_size,
-            x2=left_bottom_x + self.entry_size * n + thickness / 2,
-            y2=left_bottom_y + self.entry_size,
-            width=thickness,
-            color=WHITE,
+
+    def update_digits(self, i: int):
+        if self.digits is None:
+            return
+        positions, tex_coords = self.cell_glyphs(i)
+        first = i * self.slots * 4
+        write_region(self.digits, "position", first, positions)
+        write_region(self.digits, "tex_coords", first, tex_coords)
+
+    def update_cell_colors(self, start: int, stop: int):
+        if self.grid is None:
+            return
+        colors = [
+            c for color in self.cell_colors[start:stop] for c in color * RECT_VERTICES
+        ]
+        write_region(self.grid, "colors", start * RECT_VERTICES, colors)
+
+    def set_value(self, i: int, value: int):
+        value = cell_value(value)
+        self.data[i] = value
+        if len(str(value)) > self.slots:
+            self.slots = len(str(value))
+            if self.digits is not None:
+                self.create_digits()
+        else:
+            self.update_digits(i)
+
+    def set_cell_color(self, i: int, color: Color):
+        """Background of cell `i`"""
+        self.cell_colors[i] = color
+        self.update_cell_colors(i, i + 1)
+
+    def highlight(self, start: int, stop: int, color: Color = HIGHLIGHT):
+        """Color the backgrounds of cells [start, stop)"""
+        self.cell_colors[start:stop] = [color] * (stop - start)
+        self.update_cell_colors(start, stop)
+
+    def swap(self, i: int, j: int):
+        """Swap values and backgrounds of two cells"""
+        self.data[i], self.data[j] = self.data[j], self.data[i]
+        self.cell_colors[i], self.cell_colors[j] = (
+            self.cell_colors[j],
+            self.cell_colors[i],
         )
-        self.inside_lines = []
-        for i in range(n - 1):
-            self.inside_lines.append(
-                shapes.Line(
-                    x=left_bottom_x + self.entry_size * (i + 1),
-                    y=left_bottom_y,
-                    x2=left_bottom_x + self.entry_size * (i + 1),
-                    y2=left_bottom_y + self.entry_size,
-                    width=thickness,
-                    color=WHITE,
-                )
-            )
+        for k in (i, j):
+            self.update_digits(k)
+            self.update_cell_colors(k, k + 1)
+
+    def shift_digits(self, i: int, dx: float):
+        """Move the digits of cell `i` by `dx`, from where they belong"""
+        if self.digits is None:
+            return
+        quad_vertices = self.slots * 4
+        first = i * quad_vertices
+        write_region(self.digits, "translation", first, (dx, 0, 0) * quad_vertices)
+
+    def rebuild(self):
+        """Recreate the cells after their number changed"""
+        self.slots = max((len(str(value)) for value in self.data), default=1)
+        if self.batch is None:
+            return
+        self.create_grid()
+        self.create_digits()
+
+    def insert(self, i: int, value: int):
+        self.data.insert(i, cell_value(value))
+        self.cell_colors.insert(i, TRANSPARENT)
+        self.rebuild()
+
+    def remove(self, i: int):
+        del self.data[i]
+        del self.cell_colors[i]
+        self.rebuild()
 
-        self.entries = []
-        for i, number in enumerate(data):
-            self.entries.append(
-                pyglet.text.Label(
-                    str(number),
-                    font_size=36,
-                    x=left_bottom_x + self.entry_size / 2 + self.entry_size * i,
-                    y=y,
-                    anchor_x="center",
-                    anchor_y="center",
-                )
+    def flash(self, cells, duration: float, color: Color = HIGHLIGHT) -> Action:
+        """Highlight `cells` and fade them back to their background"""
+
+        def make():
+            backgrounds = {i: self.cell_colors[i] for i in cells}
+
+            def apply(e):
+                for i, background in backgrounds.items():
+                    self.cell_colors[i] = mix(color, background, e)
+                    self.update_cell_colors(i, i + 1)
+
+            return Tween(duration, apply, ease_linear)
+
+        return defer(make, duration)
+
+    def slide_swap(self, i: int, j: int, duration: float) -> Action:
+        """Digits of two cells move past each other, then the cells swap"""
+        dx = self.cell_x(j) - self.cell_x(i)
+
+        def apply(e):
+            self.shift_digits(i, dx * e)
+            self.shift_digits(j, -dx * e)
+
+        def finish():
+            self.shift_digits(i, 0)
+            self.shift_digits(j, 0)
+            self.swap(i, j)
+
+        return seq(Tween(duration, apply, ease_in_out_cubic), instant(finish))
+
+    def animate_op(self, op: Op, duration: float = 0.5) -> Action:
+        """Play an element operation recorded by a `log_ops` trace
+
+        Only the cells the operation touched change, reads flash their cell.
+        Appends, inserts and pops add or remove a cell, which rebuilds them.
+        """
+        if op.kind == "get":
+            return self.flash((op.index,), duration)
+        if op.kind == "set":
+            return parallel(
+                instant(lambda: self.set_value(op.index, op.new)),
+                self.flash((op.index,), duration),
+            )
+        if op.kind == "swap":
+            i, j = op.index
+            return self.slide_swap(i, j, duration)
+        if op.kind in ("append", "insert"):
+            return seq(
+                instant(lambda: self.insert(op.index, op.new)),
+                self.flash((op.index,), duration),
             )
-        self.set_color(TRANSPARENT)
-
-    def draw(self):
-        self.left_border.draw()
-        self.right_border.draw()
-        self.bottom_border.draw()
-        self.top_border.draw()
-        for line in self.inside_lines:
-            line.draw()
-
-        for entry in self.entries:
-            entry.draw()
-
-    def move_x(self, dx):
-        self.x += dx
-        self.left_border.x += dx
-        self.right_border.x += dx
-        self.bottom_border.x += dx
-        self.top_border.x += dx
-        for line in self.inside_lines:
-            line.x += dx
-
-        for entry in self.entries:
-            entry.x += dx
-
-    def move_y(self, dy):
-        self.y += dy
-        self.left_border.y += dy
-        self.right_border.y += dy
-        self.bottom_border.y += dy
-        self.top_border.y += dy
-        for line in self.inside_lines:
-            line.y += dy
-
-        for entry in self.entries:
-            entry.y += dy
-
-    def set_x(self, x):
-        delta_x = x - self.x
-        self.move_x(delta_x)
-
-    def set_y(self, y):
-        delta_y = y - self.y
-        self.move_y(delta_y)
-
-    def set_color(self, color):
-        self.left_border.color = color
-        self.right_border.color = color
-        self.bottom_border.color = color
-        self.top_border.color = color
-        for line in self.inside_lines:
-            line.color = color
-
-        for entry in self.entries:
-            entry.color = color
-
-    def set_alpha(self, alpha):
-        color = replace_alpha(self.left_border.color, alpha)
-
-        self.left_border.color = color
-        self.right_border.color = color
-        self.bottom_border.color = color
-        self.top_border.color = color
-        for line in self.inside_lines:
-            line.color = color
-
-        for entry in self.entries:
-            entry.color = color
+        if op.kind == "pop":
+            return instant(lambda: self.remove(op.index))
+        raise ValueError(f"Can't animate a {op.kind} op")
+
+    def set_color(self, color: Color):
+        """Color of the grid and the digits"""
+        self.color = color
+        if self.grid is None or self.digits is None:
+            return
+        n = len(self.data)
+        borders = self.grid.count - n * RECT_VERTICES
+        write_region(self.grid, "colors", n * RECT_VERTICES, color * borders)
+        write_region(self.digits, "colors", 0, color * self.digits.count)
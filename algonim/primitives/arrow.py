@@ -15,6 +15,7 @@ class Arrow:
         head_angle=30,
         color=(255, 255, 255),
         width=2,
+        program=None,
     ):
         """
         Represents an arrow composed of three lines: the shaft and two head lines.
@@ -27,6 +28,7 @@ class Arrow:
             head_angle (float): Angle between the shaft and arrowhead lines (degrees).
             color (tuple): RGB color of the arrow lines.
             width (float): Width of the arrow lines.
+            program (ShaderProgram): Shader for the lines, pyglet's default if None.
         """
         self.batch = batch
         self.start_x = start_x
@@ -45,7 +47,14 @@ class Arrow:
 
         # Create the lines
         self.shaft = pyglet.shapes.Line(
-            start_x, start_y, end_x, end_y, width=width, color=color, batch=batch
+            start_x,
+            start_y,
+            end_x,
+            end_y,
+            width=width,
+            color=color,
+            batch=batch,
+            program=program,
         )
         self.left_head = pyglet.shapes.Line(
             end_x,
@@ -55,6 +64,7 @@ class Arrow:
             width=width,
             color=color,
             batch=batch,
+            program=program,
         )
         self.right_head = pyglet.shapes.Line(
             end_x,
@@ -64,6 +74,7 @@ class Arrow:
             width=width,
             color=color,
             batch=batch,
+            program=program,
         )
 
         self.x = -1
@@ -85,8 +96,17 @@ class Arrow:
 
         return left_head_x, left_head_y, right_head_x, right_head_y
 
+    def attach(self, batch, group):
+        """Move the arrow's lines into another batch"""
+        self.batch = batch
+        for line in (self.shaft, self.left_head, self.right_head):
+            line.batch = batch
+            line.group = group
+
     def draw(self):
-        self.batch.draw()
+        self.shaft.draw()
+        self.left_head.draw()
+        self.right_head.draw()
 
     def set_y(self, y):
         self.shaft.y = y
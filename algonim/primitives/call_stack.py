@@ -0,0 +1,87 @@
+import reprlib
+
+import pyglet
+
+from algonim.colors import HIGHLIGHT, WHITE
+from algonim.primitives.group import GroupActor
+from algonim.python_tracer import Call
+from algonim.script import Action, instant, seq, wait
+from algonim.shaders import text_program
+
+
+class CallStack(GroupActor):
+    """Frames of the traced program's call stack, innermost on top
+
+    Shows the innermost `visible` frames, the ones below them are counted
+    in a "... N more" line at the bottom, so deep recursion keeps a fixed
+    number of labels.
+    """
+
+    def __init__(self, x, y, visible: int = 8, font_size: int = 24):
+        super().__init__(x, y)
+        self.visible = visible
+        self.font_size = font_size
+        self.line_height = font_size * 1.6
+        self.stack: list[Call] = []
+        self.labels: list[pyglet.text.Label] = []
+        """Bottom one counts the hidden frames, the others show frames"""
+        self.set_alpha(0)
+
+    def attach(self, batch, group):
+        super().attach(batch, group)
+        # Bottom up, (x, y) is the bottom left corner of the stack
+        self.labels = [
+            pyglet.text.Label(
+                "",
+                0,
+                i * self.line_height,
+                font_size=self.font_size,
+                batch=batch,
+                group=self.transform,
+                program=text_program(),
+            )
+            for i in range(self.visible + 1)
+        ]
+        self.set_stack(self.stack)
+
+    def set_stack(self, stack: list[Call], returned: dict[int, str] | None = None):
+        """Show `stack`, outermost first, and the `returned` values by id"""
+        self.stack = list(stack)
+        if not self.labels:
+            return
+        returned = returned or {}
+        shown = self.stack[-self.visible :]
+        hidden = len(self.stack) - len(shown)
+        texts = [f"... {hidden} more" if hidden else ""]
+        texts += [str(call) for call in shown]
+        texts += [""] * (len(self.labels) - len(texts))
+        for i, (label, text) in enumerate(zip(self.labels, texts, strict=True)):
+            call = shown[i - 1] if 0 < i <= len(shown) else None
+            if call is not None and call.id in returned:
+                text += f" → {returned[call.id]}"
+                label.color = HIGHLIGHT
+            else:
+                label.color = WHITE
+            label.text = text
+
+    def update(self, stack: list[Call], returns=(), duration: float = 0.5) -> Action:
+        """Show the calls that `returns` with their values, then `stack`
+
+        `returns` are the (call, value) pairs of `Snapshot.returns`.
+        """
+        if not returns:
+            return instant(lambda: self.set_stack(stack))
+        returned = {call.id: reprlib.repr(value) for call, value in returns}
+
+        def show_returns():
+            # The returned calls stay on top of the stack until they pop
+            running = {call.id for call in self.stack}
+            popped = [call for call, _ in returns if call.id not in running]
+            popped.sort(key=lambda call: call.depth)
+            self.set_stack(self.stack + popped, returned)
+
+        return seq(
+            instant(show_returns),
+            wait(duration),
+            instant(lambda: self.set_stack(stack)),
+        )
@@ -0,0 +1,122 @@
+import math
+from collections.abc import Iterable
+from typing import Any
+
+import pyglet
+from pyglet.math import Mat4, Vec3
+
+from algonim import shaders
+from algonim.window import Layer
+
+
+class TransformGroup(pyglet.graphics.Group):
+    """Translates, scales, rotates and fades everything drawn under it
+
+    The transform is multiplied into the window's view matrix and the opacity
+    into the `opacity` uniform while the group is drawn, so changing either
+    rewrites no vertex data. Nested groups compose.
+    """
+
+    def __init__(self, parent: "Layer | TransformGroup"):
+        super().__init__(parent=parent)
+        self.window: pyglet.window.Window = parent.window
+        self.matrix = Mat4()
+        self.saved_view = Mat4()
+        self.opacity = 1.0
+        self.saved_opacity = 1.0
+
+    def set_state(self):
+        self.saved_view = self.window.view
+        self.window.view = self.saved_view @ self.matrix
+        if self.opacity != 1.0:
+            self.saved_opacity = shaders.current_opacity
+            shaders.set_opacity(self.saved_opacity * self.opacity)
+
+    def unset_state(self):
+        self.window.view = self.saved_view
+        if self.opacity != 1.0:
+            shaders.set_opacity(self.saved_opacity)
+
+    # Every group has its own transform, the batch must never merge two of them
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return id(self)
+
+
+class GroupActor:
+    """Composite actor with children positioned relative to (x, y)
+
+    Subclasses create their children in local coordinates and list them in
+    `children`. Once attached, moving, scaling, rotating or fading the actor
+    updates one matrix or uniform, however many children it has. Children are
+    shapes and text layouts created with the programs from `algonim.shaders`,
+    or other actors with `attach`.
+    """
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.scale = 1.0
+        self.rotation = 0.0
+        """Counterclockwise, in degrees"""
+        self.opacity = 1.0
+        self.transform: TransformGroup | None = None
+
+    def children(self) -> Iterable[Any]:
+        """None by default, for actors that build their vertex lists in `attach`"""
+        return ()
+
+    def attach(self, batch, group):
+        self.transform = TransformGroup(group)
+        self.update_transform()
+        self.set_opacity(self.opacity)
+        for child in self.children():
+            if hasattr(child, "attach"):
+                child.attach(batch, self.transform)
+            else:
+                child.batch = batch
+                child.group = self.transform
+
+    def update_transform(self):
+        if self.transform is None:
+            return
+        self.transform.matrix = (
+            Mat4.from_translation(Vec3(self.x, self.y, 0))
+            @ Mat4.from_rotation(math.radians(self.rotation), Vec3(0, 0, 1))
+            @ Mat4.from_scale(Vec3(self.scale, self.scale, 1))
+        )
+
+    def set_x(self, x):
+        self.x = x
+        self.update_transform()
+
+    def set_y(self, y):
+        self.y = y
+        self.update_transform()
+
+    def move_x(self, dx):
+        self.set_x(self.x + dx)
+
+    def move_y(self, dy):
+        self.set_y(self.y + dy)
+
+    def set_scale(self, scale):
+        self.scale = scale
+        self.update_transform()
+
+    def set_rotation(self, rotation):
+        self.rotation = rotation
+        self.update_transform()
+
+    def set_opacity(self, opacity: float):
+        self.opacity = opacity
+        if self.transform is None:
+            return
+        self.transform.opacity = opacity
+        # Fully transparent actors are skipped by the batch, no draw calls
+        self.transform.visible = opacity > 0
+
+    def set_alpha(self, alpha):
+        self.set_opacity(alpha / 255)
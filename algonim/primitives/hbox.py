@@ -1,5 +1,6 @@
 import pyglet
 
+from algonim.colors import HIGHLIGHT
 from algonim.script import Script
 
 
@@ -7,13 +8,16 @@ class HighlightBox:
     def __init__(self, x, y, width, height, script: Script):
         self.x = x
         self.y = y
-        self.box = pyglet.shapes.Rectangle(
-            x, y, width, height, color=(255, 179, 67, 255)
-        )
-        script.register(self)
+        self.box = pyglet.shapes.Rectangle(x, y, width, height, color=HIGHLIGHT)
+        # Behind the text it highlights
+        script.register(self, layer=-1)
 
     def set_height(self, height):
         self.box.height = height
 
+    def attach(self, batch, group):
+        self.box.batch = batch
+        self.box.group = group
+
     def draw(self):
         self.box.draw()
@@ -1,15 +1,34 @@
+import functools
+import math
+from collections import OrderedDict
+
 import pyglet
+from pyglet.math import Mat4, Vec3
+from pyglet.text.layout import TextLayout
 from pygments import highlight
 from pygments.formatter import Formatter
 from pygments.lexers import PythonLexer
 from pygments.styles import get_style_by_name
 from pygments.token import Token
 
-from algonim.easing import ease_in_out_cubic
+from algonim.colors import WHITE, Color
+from algonim.easing import ease_in_out_cubic, lerp
 from algonim.primitives.arrow import Arrow
-from algonim.script import ActionFn, defer, move_to
+from algonim.primitives.group import GroupActor, TransformGroup
+from algonim.script import Action, Tween, defer, move_to, parallel
+from algonim.shaders import shape_program, text_program
+
+FONT_NAME = "FiraCode Nerd Font Mono"
+
+CULL_MARGIN = 4
+"""Lines laid out past each window edge, so slow scrolls create none"""
+CACHED_LINES = 64
+"""Hidden lines kept for scrolling back"""
+SCROLL_PADDING = 2
+"""Lines kept between `hl`'s line and the window edge"""
 
 
+@functools.cache
 def hex_to_rgba(hex_color: str) -> tuple[int, int, int, int]:
     if hex_color.startswith("#"):
         hex_color = hex_color[1:]
@@ -42,79 +61,222 @@ def hello_world():
     print("Hello, world!")
 """
 
+type Run = tuple[str, Color]
+
+
+@functools.cache
+def styled_lines(source: str, style: str) -> tuple[tuple[Run, ...], ...]:
+    """Source lexed into lines of (text, color) runs
+
+    Cached, so views of the same source share one lexing pass. Adjacent
+    tokens of the same color are merged into one run.
+    """
+    formatter = PygletFormatter(style=style)
+    highlight(source, PythonLexer(), formatter)  # This populates formatter.output
+
+    lines: list[list[Run]] = [[]]
+    for value, rgba in formatter.output:
+        for i, text in enumerate(value.split("\n")):
+            if i > 0:
+                lines.append([])
+            line = lines[-1]
+            if not text:
+                continue
+            if line and line[-1][1] == rgba:
+                line[-1] = (line[-1][0] + text, rgba)
+            else:
+                line.append((text, rgba))
+    return tuple(tuple(line) for line in lines)
+
+
+def line_document(runs: tuple[Run, ...], font_size: int):
+    text = "".join(text for text, _ in runs)
+    document = pyglet.text.document.FormattedDocument(text)
+    document.set_style(0, len(text), {"font_size": font_size, "font_name": FONT_NAME})
+    start = 0
+    for run, rgba in runs:
+        document.set_style(start, start + len(run), {"color": rgba})
+        start += len(run)
+    return document
+
 
-class HighlightedCode:
-    def __init__(self, code: str, x, y, font_size: int):
+class HighlightedCode(GroupActor):
+    """Source code with line numbers and a cursor pointing at a line
+
+    Only lines inside the window, plus a margin, are laid out. Lines are
+    scrolled under one transform, a line that scrolls out is hidden and kept
+    for a while, so scrolling back reuses its layout. `hl` scrolls the view
+    when the line it points at is off-screen.
+    """
+
+    def __init__(self, code: str, x, y, font_size: int, style: str = "monokai"):
+        super().__init__(x, y)
         self.font_size = font_size
-        formatter = PygletFormatter(style="monokai")
-        lexer = PythonLexer()
-        highlight(code, lexer, formatter)  # This populates formatter.output
-
-        document = pyglet.text.document.FormattedDocument()
-        for value, rgba in formatter.output:
-            document.insert_text(
-                len(document.text),
-                value,
-                {
-                    "color": rgba,
-                    "font_size": font_size,
-                    "font_name": "FiraCode Nerd Font Mono",
-                },
-            )
+        self.source = styled_lines(code, style)
+        self.n_lines = len(self.source)
+
+        # All lines share one font, so they are evenly spaced from the top,
+        # local y = 0 is the bottom of the last line
+        font = pyglet.font.load(FONT_NAME, font_size)
+        self.line_height = font.ascent - font.descent
+        self.content_height = self.n_lines * self.line_height
+        first = self.content_height - font.ascent
+        # Baseline of every line, so highlight moves are plain lookups
+        self.line_y = [first - i * self.line_height for i in range(self.n_lines)]
 
-        self.layout = pyglet.text.layout.TextLayout(
-            document, multiline=True, wrap_lines=False
-        )
-        self.layout.x = x
-        self.layout.y = y
-        self.layout.width = self.layout.content_width
-        self.layout.height = self.layout.content_height
         # self.cursor = pyglet.shapes.Circle(x, y, 20)
         self.cursor = Arrow(
-            pyglet.graphics.Batch(), x - 150, y, x - 100, y, head_length=25, width=3
-        )
-
-        n_lines = len(self.layout._get_lines())
-        numbers = pyglet.text.document.FormattedDocument()
-        for i in range(1, n_lines):
-            digits = str(i)
-            prefix = " " if len(digits) == 1 else ""
-            numbers.insert_text(
-                len(numbers.text),
-                prefix + str(i) + ("\n" if i < n_lines - 1 else ""),
-                {
-                    "color": [255, 255, 255, 255],
-                    "font_size": font_size,
-                    "font_name": "FiraCode Nerd Font Mono",
-                },
-            )
-        self.numbers = pyglet.text.layout.TextLayout(
-            numbers, multiline=True, wrap_lines=False
+            pyglet.graphics.Batch(),
+            -150,
+            0,
+            -100,
+            0,
+            head_length=25,
+            width=3,
+            program=shape_program(),
         )
-        self.numbers.y = self.layout.top - self.numbers.content_height
-        self.numbers.x = self.layout.x - 80
-        # self.cursor.x = self.layout.x - 120
-        # self.numbers.y = self.layout.y
-
+        # Every line but the last one, which is empty in a file ending with \n
         self.line = pyglet.shapes.Line(
-            self.numbers.x + 60,
-            self.numbers.y,
-            self.numbers.x + 60,
-            self.numbers.y + self.numbers.content_height,
+            -20,
+            self.line_height,
+            -20,
+            self.content_height,
             width=3,
+            program=shape_program(),
         )
 
-    def hl(self, lineno: int, line) -> ActionFn:
-        def make():
-            line_y = self.layout._get_lines()[lineno].y
-            final_y = line_y + self.layout.y + self.layout.content_height + 60
+        self.batch: pyglet.graphics.Batch | None = None
+        self.content: TransformGroup | None = None
+        self.scroll = 0.0
+        """Vertical offset of the lines, in local coordinates"""
+        self.view = range(0)
+        self.rows: OrderedDict[int, list[TextLayout]] = OrderedDict()
+        """Layouts of each laid out line, least recently visible first"""
+
+    def attach(self, batch, group):
+        self.batch = batch
+        super().attach(batch, group)
+        self.content = TransformGroup(self.transform)
+        self.line.batch = batch
+        self.line.group = self.content
+        self.cursor.attach(batch, self.content)
+        self.set_scroll(self.scroll_for(0))
+
+    def update_transform(self):
+        super().update_transform()
+        self.cull()
+
+    def set_scroll(self, scroll: float):
+        self.scroll = scroll
+        if self.content is None:
+            return
+        self.content.matrix = Mat4.from_translation(Vec3(0, scroll, 0))
+        self.cull()
+
+    def window_lines(self) -> tuple[float, float] | None:
+        """Window's bottom and top edge in lines from the bottom of the code"""
+        if self.transform is None or self.rotation % 360 != 0:
+            return None
+        height = self.transform.window.height
+        bottom = -self.y / self.scale - self.scroll
+        top = (height - self.y) / self.scale - self.scroll
+        return bottom / self.line_height, top / self.line_height
+
+    def visible_lines(self) -> range:
+        """Lines that overlap the window, widened by `CULL_MARGIN`"""
+        edges = self.window_lines()
+        if edges is None:
+            return range(self.n_lines)
+
+        # Line i spans [n - i - 1, n - i] lines from the bottom
+        bottom, top = edges
+        first = math.floor(self.n_lines - 1 - top) - CULL_MARGIN
+        stop = math.ceil(self.n_lines - bottom) + CULL_MARGIN
+        first = max(0, first)
+        return range(first, max(first, min(self.n_lines, stop)))
+
+    def scroll_for(self, lineno: int) -> float:
+        """Smallest change of `scroll` that puts `lineno` inside the window"""
+        edges = self.window_lines()
+        if edges is None:
+            return self.scroll
+
+        bottom, top = edges
+        line_bottom = self.n_lines - lineno - 1
+        # Lines to scroll up (positive) or down so the line clears the edges
+        up = (bottom + SCROLL_PADDING) - line_bottom
+        down = (line_bottom + 1) - (top - SCROLL_PADDING)
+        if up > 0:
+            return self.scroll + up * self.line_height
+        if down > 0:
+            return self.scroll - down * self.line_height
+        return self.scroll
 
-            return move_to(self.cursor, self.cursor.x, final_y, 0.5, ease_in_out_cubic)
+    def cull(self):
+        if self.content is None:
+            return
+        view = self.visible_lines()
+        if view == self.view:
+            return
 
-        return defer(make)
+        for i in self.view:
+            if i not in view and i in self.rows:
+                for layout in self.rows[i]:
+                    layout.visible = False
+        for i in view:
+            if i in self.rows:
+                self.rows.move_to_end(i)
+                for layout in self.rows[i]:
+                    layout.visible = True
+            else:
+                self.rows[i] = self.create_row(i)
+        self.view = view
+
+        # Visible rows were just moved to the end, the oldest ones are hidden
+        while len(self.rows) > len(view) + CACHED_LINES:
+            _, row = self.rows.popitem(last=False)
+            for layout in row:
+                layout.delete()
+
+    def create_row(self, i: int) -> list[TextLayout]:
+        row: list[TextLayout] = []
+        y = self.line_y[i]
+        if self.source[i]:
+            row.append(
+                self.create_layout(line_document(self.source[i], self.font_size), 0, y)
+            )
+        if i < self.n_lines - 1:
+            number = f"{i + 1:>2}"
+            document = line_document(((number, WHITE),), self.font_size)
+            row.append(self.create_layout(document, -80, y))
+        return row
+
+    def create_layout(self, document, x: float, y: float) -> TextLayout:
+        return TextLayout(
+            document,
+            x=x,
+            y=y,
+            anchor_y="baseline",
+            batch=self.batch,
+            group=self.content,
+            program=text_program(),
+        )
+
+    def scroll_to(
+        self, scroll: float, duration: float, ease=ease_in_out_cubic
+    ) -> Action:
+        start = self.scroll
+        return Tween(duration, lambda e: self.set_scroll(lerp(start, scroll, e)), ease)
+
+    def hl(self, lineno: int, line, duration: float = 0.5) -> Action:
+        def make():
+            final_y = self.line_y[lineno] + 60
+            cursor = move_to(
+                self.cursor, self.cursor.x, final_y, duration, ease_in_out_cubic
+            )
+            scroll = self.scroll_for(lineno)
+            if scroll == self.scroll:
+                return cursor
+            return parallel(cursor, self.scroll_to(scroll, duration))
 
-    def draw(self):
-        self.layout.draw()
-        self.cursor.draw()
-        self.numbers.draw()
-        self.line.draw()
+        return defer(make, duration)
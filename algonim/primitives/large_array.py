@@ -0,0 +1,192 @@
+import ctypes
+import math
+from typing import Literal
+
+import numpy as np
+import numpy.typing as npt
+import pyglet
+from pyglet import gl
+from pyglet.graphics.vertexdomain import VertexList
+
+from algonim.colors import HIGHLIGHT, WHITE, Color
+from algonim.primitives.group import GroupActor
+from algonim.shaders import ShapeGroup, chart_program
+
+QUAD = (0, 0, 1, 0, 1, 1, 0, 0, 1, 1, 0, 1)
+QUAD_VERTICES = 6
+
+HEAT_LOW = (40, 70, 170, 255)
+
+
+def write_array(vertex_list, name: str, first: int, data: np.ndarray):
+    """Copy `data` over `name` from vertex `first` on, in one memmove"""
+    buffer = vertex_list.domain.attrib_name_buffers[name]
+    data = np.ascontiguousarray(data)
+    offset = (vertex_list.start + first) * buffer.stride
+    assert offset + data.nbytes <= buffer.size
+    ctypes.memmove(buffer.data_ptr + offset, data.ctypes.data, data.nbytes)
+    buffer.invalidate_region(vertex_list.start + first, data.nbytes // buffer.stride)
+
+
+class ChartGroup(ShapeGroup):
+    """Sets the chart's layout uniforms before its bars are drawn"""
+
+    def __init__(self, chart: "LargeArray", parent):
+        super().__init__(chart_program(), parent=parent)
+        self.chart = chart
+
+    def set_state(self):
+        super().set_state()
+        chart = self.chart
+        self.program["first"] = chart.view.start
+        self.program["origin"] = (chart.left, -chart.height / 2)
+        self.program["cell"] = (chart.cell_width, chart.height)
+        self.program["gap"] = chart.gap
+        self.program["max_value"] = chart.max_value
+        self.program["heat"] = chart.mode == "heat"
+        self.program["low"] = tuple(c / 255 for c in chart.low)
+        self.program["high"] = tuple(c / 255 for c in chart.high)
+
+
+class LargeArray(GroupActor):
+    """Array of thousands of values, drawn as bars or as a row of heat cells
+
+    Values live in a NumPy array. Every bar is a quad whose shape the vertex
+    shader computes from the value, and all bars are one vertex list, so the
+    whole chart is a single draw call and updates are vectorized copies.
+    Only cells inside the window get vertices: moving or scaling the chart
+    re-culls them.
+    """
+
+    def __init__(
+        self,
+        x,
+        y,
+        data: npt.ArrayLike,
+        width: float = 1600,
+        height: float = 600,
+        mode: Literal["bars", "heat"] = "bars",
+        max_value: float | None = None,
+        gap: float = 0.2,
+    ):
+        super().__init__(x, y)
+        self.values = np.array(data, dtype=np.float32)
+        self.colors = np.full((len(self.values), 4), WHITE, dtype=np.uint8)
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.max_value = max_value or float(self.values.max(initial=1.0))
+        self.gap = gap
+        self.low: Color = HEAT_LOW
+        self.high: Color = HIGHLIGHT
+
+        self.batch: pyglet.graphics.Batch | None = None
+        self.bars: VertexList | None = None
+        self.capacity = 0
+        self.view = range(0)
+        self.set_alpha(0)
+
+    @property
+    def cell_width(self) -> float:
+        return self.width / max(1, len(self.values))
+
+    @property
+    def left(self) -> float:
+        # Local coordinates, centered on (x, y)
+        return -self.width / 2
+
+    def attach(self, batch, group):
+        self.batch = batch
+        super().attach(batch, group)
+
+    def update_transform(self):
+        super().update_transform()
+        self.cull()
+
+    def visible_range(self) -> range:
+        """Cells that overlap the window horizontally"""
+        n = len(self.values)
+        if self.transform is None or self.rotation % 360 != 0:
+            return range(n)
+
+        cell = self.cell_width * self.scale
+        left = self.x + self.left * self.scale
+        first = max(0, math.floor(-left / cell))
+        stop = min(n, math.ceil((self.transform.window.width - left) / cell))
+        return range(first, max(first, stop))
+
+    def cull(self):
+        if self.transform is None:
+            return
+        view = self.visible_range()
+        if view == self.view:
+            return
+
+        self.view = view
+        if len(view) > self.capacity:
+            self.create_bars(len(view))
+        self.upload(view.start, view.stop)
+        # Slots past the visible cells stay allocated, hidden
+        hidden = (self.capacity - len(view)) * QUAD_VERTICES
+        if hidden:
+            write_array(
+                self.bars,
+                "colors",
+                len(view) * QUAD_VERTICES,
+                np.zeros((hidden, 4), dtype=np.uint8),
+            )
+
+    def create_bars(self, capacity: int):
+        assert self.batch is not None
+        if self.bars is not None:
+            self.bars.delete()
+
+        self.capacity = capacity
+        count = capacity * QUAD_VERTICES
+        program = chart_program()
+        self.bars = program.vertex_list(
+            count,
+            gl.GL_TRIANGLES,
+            self.batch,
+            ChartGroup(self, parent=self.transform),
+            corner=("f", QUAD * capacity),
+            index=("f", np.repeat(np.arange(capacity), QUAD_VERTICES).tolist()),
+            value=("f", (0,) * count),
+            colors=("Bn", (0,) * 4 * count),
+        )
+
+    def upload(self, start: int, stop: int):
+        """Copy values and colors of cells [start, stop) that are visible"""
+        lo = max(start, self.view.start)
+        hi = min(stop, self.view.stop)
+        if self.bars is None or lo >= hi:
+            return
+
+        first = (lo - self.view.start) * QUAD_VERTICES
+        values = np.repeat(self.values[lo:hi], QUAD_VERTICES)
+        colors = np.repeat(self.colors[lo:hi], QUAD_VERTICES, axis=0)
+        write_array(self.bars, "value", first, values)
+        write_array(self.bars, "colors", first, colors)
+
+    def set_values(self, values: npt.ArrayLike, start: int = 0):
+        """Overwrite cells from `start` on"""
+        values = np.asarray(values, dtype=np.float32)
+        self.values[start : start + len(values)] = values
+        self.upload(start, start + len(values))
+
+    def set_value(self, i: int, value: float):
+        self.set_values((value,), i)
+
+    def swap(self, i: int, j: int):
+        self.values[[i, j]] = self.values[[j, i]]
+        self.colors[[i, j]] = self.colors[[j, i]]
+        for k in (i, j):
+            self.upload(k, k + 1)
+
+    def highlight(self, start: int, stop: int, color: Color = HIGHLIGHT):
+        """Color cells [start, stop), multiplied with the heat color in heat mode"""
+        self.colors[start:stop] = color
+        self.upload(start, stop)
+
+    def set_color(self, color: Color):
+        self.highlight(0, len(self.values), color)
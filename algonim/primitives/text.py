@@ -1,11 +1,13 @@
 import pyglet
 from pyglet.customtypes import AnchorX, AnchorY
 
-from algonim.colors import WHITE, Color, replace_alpha
+from algonim.colors import WHITE, Color
+from algonim.primitives.group import GroupActor
 from algonim.script import Script
+from algonim.shaders import text_program
 
 
-class Text:
+class Text(GroupActor):
     def __init__(
         self,
         script: Script,
@@ -18,34 +20,23 @@ class Text:
         anchor_x: AnchorX = "center",
         anchor_y: AnchorY = "center",
     ):
-        self.x = x
-        self.y = y
+        super().__init__(x, y)
         self.label = pyglet.text.Label(
             text,
-            x,
-            y,
+            0,
+            0,
             anchor_x=anchor_x,
             anchor_y=anchor_y,
             font_size=font_size,
             bold=bold,
+            program=text_program(),
         )
         self.label.color = color
         self.set_alpha(0)
         script.register(self)
 
+    def children(self):
+        return (self.label,)
+
     def set_color(self, color: Color):
         self.label.color = color
-
-    def set_alpha(self, alpha):
-        self.label.color = replace_alpha(self.label.color, alpha)
-
-    def set_x(self, x):
-        self.x = x
-        self.label.x = x
-
-    def set_y(self, y):
-        self.y = y
-        self.label.y = y
-
-    def draw(self):
-        self.label.draw()
@@ -1,17 +1,22 @@
 import pyglet
 
+from algonim.script import Action, instant
+
 
 class Var:
     def __init__(self, x, y, varname: str, value: str):
         self.label = pyglet.text.Label(f"{varname} = {value}", x, y, font_size=32)
         self.varname = varname
 
-    def update_val(self, value):
-        def update(delta):
+    def update_val(self, value) -> Action:
+        def update():
             self.label.text = f"{self.varname} = {value}"
-            return True
 
-        return update
+        return instant(update)
+
+    def attach(self, batch, group):
+        self.label.batch = batch
+        self.label.group = group
 
     def draw(self):
         self.label.draw()
@@ -1,11 +1,49 @@
+import builtins
+import inspect
 import linecache
+import math
 import pathlib
+import queue
+import reprlib
 import runpy
 import sys
-from copy import deepcopy
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections.abc import Callable, Generator, Iterable, Iterator
+from copy import copy, deepcopy
 from dataclasses import dataclass
+from types import CodeType, FrameType
 from typing import Any
 
+from algonim.trace_cache import load_trace, store_trace, trace_key
+from algonim.traced_containers import (
+    CONSTRUCTORS,
+    ELEMENT_KINDS,
+    Op,
+    TracedDict,
+    TracedList,
+    coalesce_swaps,
+    instrument,
+)
+
+TOOL_IDS = (sys.monitoring.DEBUGGER_ID, 3, 4, 1, 2, 5)
+"""`sys.monitoring` tool ids a trace may claim, in order, the unnamed ones
+before the ids of coverage, profilers and optimizers"""
+
+TRACER_VERSION = 3
+"""Part of the trace cache key, bump it when traces are recorded differently"""
+
+STOP_GRACE = 0.1
+"""Seconds past its deadline a program gets to stop before it is abandoned"""
+
+KEYFRAME_INTERVAL = 256
+"""Most steps between two keyframes of a `Trace`, and fewest elements of deltas"""
+
+IMMUTABLE = frozenset({int, float, complex, bool, str, bytes, range})
+"""Types recorded without a copy, deepcopy would return the value itself"""
+
 
 @dataclass
 class Changed:
@@ -13,8 +51,33 @@ class Changed:
     to: str
 
 
+@dataclass(frozen=True, slots=True)
+class Call:
+    """One call of a function of the traced program"""
+
+    id: int
+    parent: int
+    """Id of the call this one was called from, -1 for the top level"""
+    function: str
+    depth: int
+    """1 for calls from the top level"""
+    args: dict[str, Any]
+    step: int
+    """First step recorded after the call started"""
+
+    def __str__(self) -> str:
+        args = ", ".join(f"{name}={reprlib.repr(v)}" for name, v in self.args.items())
+        return f"{self.function}({args})"
+
+
 @dataclass
 class Snapshot:
+    """Watched variables just before line `lineno` runs
+
+    Snapshots of a `Trace` share values that did not change between steps,
+    treat `vars` as read-only.
+    """
+
     vars: dict[str, Any]
     line: str
     lineno: int
@@ -23,8 +86,31 @@ class Snapshot:
         self.vars = vars
         self.line = line
         self.lineno = lineno
+        # Set for snapshots rebuilt from a `Trace`
+        self.trace: Trace | None = None
+        self.step = -1
+        self.delta: Delta | None = None
+        self.ops: dict[str, tuple[Op, ...]] = {}
+        """Element operations on each variable since the previous step"""
+        self.returns: tuple[tuple[Call, Any], ...] = ()
+        """Calls that returned since the previous step, with their values"""
+
+    def stack(self) -> list[Call]:
+        """Calls running at this step, outermost first"""
+        if self.trace is None:
+            return []
+        return self.trace.stack(self.step)
+
+    def follows(self, other: "Snapshot") -> bool:
+        """True if `self.delta` leads from `other` to this snapshot"""
+        if self.step == 0:
+            return not other.vars
+        return other.trace is self.trace and other.step == self.step - 1
 
     def diff(self, other) -> tuple[set[str], dict[str, Changed]]:
+        if self.trace is not None and self.follows(other):
+            return self.diff_delta(other)
+
         new_vars = set(self.vars.keys()).difference(other.vars.keys())
 
         changed = {}
@@ -38,13 +124,384 @@ class Snapshot:
 
         return new_vars, changed
 
+    def diff_delta(self, other) -> tuple[set[str], dict[str, Changed]]:
+        """Same as `diff`, only the variables in the recorded delta are compared
+
+        A delta also records `1` becoming `1.0`, so values are still compared
+        with `!=` like `diff` does.
+        """
+        new_vars = set()
+        changed = {}
+        for varname, edit in (self.delta or {}).items():
+            if isinstance(edit, Unbind):
+                continue
+            if varname not in other.vars:
+                new_vars.add(varname)
+            elif (oldval := other.vars[varname]) != (newval := self.vars[varname]):
+                changed[varname] = Changed(oldval, newval)
+        return new_vars, changed
+
+
+def copy_value(value):
+    return value if type(value) in IMMUTABLE else deepcopy(value)
+
+
+def cost(value) -> int:
+    """Rough size of a value, in elements"""
+    if type(value) in (list, dict, tuple, set):
+        return len(value) + 1
+    return 1
+
+
+@dataclass(frozen=True, slots=True)
+class Rebind:
+    value: Any
+
+    def apply(self, old):
+        return self.value
+
+    @property
+    def size(self) -> int:
+        return cost(self.value)
+
+    def __reduce__(self):
+        # Slots dataclasses pickle through Python-level state hooks, this is
+        # a few times faster, and there is one of these per changed variable
+        return Rebind, (self.value,)
+
+
+@dataclass(frozen=True, slots=True)
+class Unbind:
+    size = 1
+
+
+UNBIND = Unbind()
+"""Variable went out of scope, or became falsy"""
+
+
+@dataclass(frozen=True, slots=True)
+class ListEdit:
+    length: int
+    items: dict[int, Any]
+
+    def apply(self, old: list) -> list:
+        new = old[: self.length]
+        new.extend([None] * (self.length - len(new)))
+        for i, value in self.items.items():
+            new[i] = value
+        return new
+
+    @property
+    def size(self) -> int:
+        return len(self.items) + 1
+
+
+@dataclass(frozen=True, slots=True)
+class DictEdit:
+    items: dict[Any, Any]
+    removed: tuple[Any, ...]
+
+    def apply(self, old: dict) -> dict:
+        new = dict(old)
+        for key in self.removed:
+            del new[key]
+        new.update(self.items)
+        return new
+
+    @property
+    def size(self) -> int:
+        return len(self.items) + len(self.removed) + 1
+
+
+type Edit = Rebind | Unbind | ListEdit | DictEdit
+type Delta = dict[str, Edit]
+
+MISSING: Any = object()
+
+
+def edit_value(old, new) -> Edit | None:
+    """Smallest edit turning `old` into `new`, None if they are equal"""
+    if type(old) is not type(new):
+        return Rebind(copy_value(new))
+    if old == new:
+        return None
+
+    if type(new) is list:
+        items = {
+            i: copy_value(b)
+            for i, (a, b) in enumerate(zip(old, new, strict=False))
+            if a != b
+        }
+        items.update((i, copy_value(new[i])) for i in range(len(old), len(new)))
+        if len(items) <= len(new) // 2:
+            return ListEdit(len(new), items)
+    elif type(new) is dict:
+        items = {
+            k: copy_value(v) for k, v in new.items() if k not in old or old[k] != v
+        }
+        removed = tuple(k for k in old if k not in new)
+        if len(items) + len(removed) <= len(new) // 2:
+            return DictEdit(items, removed)
+    return Rebind(copy_value(new))
+
+
+def edit_from_ops(
+    old, new: TracedList | TracedDict, ops: tuple[Op, ...]
+) -> Edit | None:
+    """Same as `edit_value`, only the elements `ops` touched are compared"""
+    if type(new) is TracedList:
+        touched: set[int] = set()
+        # Inserts and pops shift every element after them
+        shifted = len(new)
+        for op in ops:
+            if op.kind == "swap":
+                touched.update(op.index)
+            elif op.kind in ("set", "append"):
+                touched.add(op.index)
+            elif op.kind in ("insert", "pop"):
+                shifted = min(shifted, op.index)
+        touched.update(range(shifted, len(new)))
+
+        items = {}
+        for i in touched:
+            if i < len(new):
+                value = list.__getitem__(new, i)
+                if i >= len(old) or old[i] != value:
+                    items[i] = value
+        if not items and len(new) == len(old):
+            return None
+        if len(items) <= len(new) // 2:
+            return ListEdit(len(new), items)
+        return Rebind(list(new))
+
+    # The last write of each key tells its value, the dict isn't read
+    last: dict[Any, Any] = {}
+    for op in ops:
+        if op.kind == "swap":
+            last.update(zip(op.index, op.new, strict=True))
+        elif op.kind == "pop":
+            last[op.index] = MISSING
+        elif op.kind != "get":
+            last[op.index] = op.new
+    changed = {}
+    removed = []
+    for key, value in last.items():
+        if value is MISSING:
+            if key in old:
+                removed.append(key)
+        elif key not in old or old[key] != value:
+            changed[key] = value
+    if not changed and not removed:
+        return None
+    if len(changed) + len(removed) <= len(new) // 2:
+        return DictEdit(changed, tuple(removed))
+    return Rebind(dict(new))
+
+
+def apply_delta(vars: dict[str, Any], delta: Delta):
+    """Update `vars` in place, the values in it are replaced, never mutated"""
+    for varname, edit in delta.items():
+        if isinstance(edit, Unbind):
+            del vars[varname]
+        else:
+            vars[varname] = edit.apply(vars.get(varname, MISSING))
+
+
+class Trace:
+    """Snapshots of a traced program, stored as deltas between steps
+
+    A step records only the variables that changed, and for lists and dicts
+    only the changed elements. Any step's state is rebuilt from the closest
+    keyframe before it. One is taken every `KEYFRAME_INTERVAL` steps, or
+    sooner once the deltas since the last one outgrow the state, so a
+    rebuild replays about one state's worth. Small states wait for
+    `KEYFRAME_INTERVAL` elements of deltas. Iterating replays the deltas in
+    order.
+    """
+
+    def __init__(self) -> None:
+        self.linenos = array("i")
+        self.deltas: list[Delta | None] = []
+        self.line_text: dict[int, str] = {}
+        # The state before the first step is the first keyframe
+        self.keyframe_steps = [-1]
+        self.keyframes: list[dict[str, Any]] = [{}]
+        self.state: dict[str, Any] = {}
+        self.since_keyframe = 0
+        self.ops: dict[int, dict[str, tuple[Op, ...]]] = {}
+        """Element operations before each step of `log_ops` traces, if any"""
+        # Filled for traces with calls, see `CallLog`
+        self.calls: list[Call] = []
+        self.call_ids = array("i")
+        """Innermost call running at each step, -1 at the top level"""
+        self.returns: dict[int, tuple[tuple[int, Any], ...]] = {}
+        """Ids and values of the calls that returned before each step"""
+
+    def record(
+        self,
+        lineno: int,
+        line: str,
+        values: dict[str, Any],
+        ops: dict[str, tuple[Op, ...]] | None = None,
+    ):
+        """Add a step, `values` are the live variables, copied only if changed
+
+        Traced containers in `values` are diffed through their `ops`.
+        """
+        state = self.state
+        delta: Delta = {}
+        for varname in state:
+            if varname not in values:
+                delta[varname] = UNBIND
+        for varname, value in values.items():
+            old = state.get(varname, MISSING)
+            # Scalars are most of the values, compared here without a call
+            if type(value) in IMMUTABLE:
+                if type(old) is not type(value) or old != value:
+                    delta[varname] = Rebind(value)
+                continue
+            if ops is not None and varname in ops:
+                edit = edit_from_ops(old, value, ops[varname])
+            else:
+                edit = edit_value(old, value)
+            if edit is not None:
+                delta[varname] = edit
+        if ops is not None:
+            ops = {varname: var_ops for varname, var_ops in ops.items() if var_ops}
+        self.add(lineno, line, delta or None, ops or None)
+
+    def add(
+        self,
+        lineno: int,
+        line: str,
+        delta: Delta | None,
+        ops: dict[str, tuple[Op, ...]] | None = None,
+    ):
+        """Add a step given by what changed since the last one"""
+        step = len(self.linenos)
+        self.linenos.append(lineno)
+        self.line_text.setdefault(lineno, line)
+        self.deltas.append(delta)
+        if ops:
+            self.ops[step] = ops
+        if not delta:
+            return
+
+        apply_delta(self.state, delta)
+        self.since_keyframe += sum(edit.size for edit in delta.values())
+        if self.keyframe_due(step):
+            # Values are never mutated, a shallow copy is enough
+            self.keyframe_steps.append(step)
+            self.keyframes.append(dict(self.state))
+            self.since_keyframe = 0
+
+    def keyframe_due(self, step: int) -> bool:
+        if step - self.keyframe_steps[-1] >= KEYFRAME_INTERVAL:
+            return True
+        if self.since_keyframe < KEYFRAME_INTERVAL:
+            return False
+        return self.since_keyframe >= sum(cost(value) for value in self.state.values())
+
+    def extend(
+        self,
+        linenos: Iterable[int],
+        line_text: dict[int, str],
+        deltas: list[Delta | None],
+        keyframes: list[tuple[int, dict[str, Any]]],
+        ops: dict[int, dict[str, tuple[Op, ...]]],
+        calls: list[Call],
+        call_ids: Iterable[int],
+        returns: dict[int, tuple[tuple[int, Any], ...]],
+    ):
+        """Add steps another trace recorded, along with its keyframes
+
+        Nothing is replayed, so a trace filled this way can't `add` steps.
+        """
+        self.linenos.extend(linenos)
+        self.line_text.update(line_text)
+        self.deltas.extend(deltas)
+        self.ops.update(ops)
+        self.calls.extend(calls)
+        self.call_ids.extend(call_ids)
+        self.returns.update(returns)
+        for step, keyframe in keyframes:
+            self.keyframe_steps.append(step)
+            self.keyframes.append(keyframe)
+
+    def __len__(self) -> int:
+        return len(self.linenos)
+
+    def state_at(self, step: int) -> dict[str, Any]:
+        k = bisect_right(self.keyframe_steps, step) - 1
+        vars = dict(self.keyframes[k])
+        for delta in self.deltas[self.keyframe_steps[k] + 1 : step + 1]:
+            if delta:
+                apply_delta(vars, delta)
+        return vars
+
+    def snapshot(self, step: int, vars: dict[str, Any]) -> Snapshot:
+        lineno = self.linenos[step]
+        snapshot = Snapshot(vars, self.line_text[lineno], lineno)
+        snapshot.trace = self
+        snapshot.step = step
+        snapshot.delta = self.deltas[step]
+        snapshot.ops = self.ops.get(step, snapshot.ops)
+        if returns := self.returns.get(step):
+            snapshot.returns = tuple((self.calls[i], value) for i, value in returns)
+        return snapshot
+
+    def stack(self, step: int) -> list[Call]:
+        """Calls running at `step`, outermost first"""
+        stack = []
+        call_id = self.call_ids[step] if step < len(self.call_ids) else -1
+        while call_id != -1:
+            call = self.calls[call_id]
+            stack.append(call)
+            call_id = call.parent
+        stack.reverse()
+        return stack
+
+    def __getitem__(self, step: int) -> tuple[int, Snapshot]:
+        if step < 0:
+            step += len(self)
+        if not 0 <= step < len(self):
+            raise IndexError(f"Step {step} out of range")
+        return self.linenos[step], self.snapshot(step, self.state_at(step))
+
+    def __iter__(self) -> Iterator[tuple[int, Snapshot]]:
+        return self.follow(range(len(self)))
+
+    def follow(self, steps: Iterable[int]) -> Iterator[tuple[int, Snapshot]]:
+        """Snapshots of increasing `steps`, replaying the deltas in between
+
+        Steps may be recorded while this runs, as long as each one is
+        recorded before it is reached.
+        """
+        vars: dict[str, Any] = {}
+        replayed = -1
+        for step in steps:
+            for delta in self.deltas[replayed + 1 : step + 1]:
+                if delta:
+                    vars = dict(vars)
+                    apply_delta(vars, delta)
+            replayed = step
+            yield self.linenos[step], self.snapshot(step, vars)
+
 
 class Tracer:
+    """Records watched variables before every line of `filepath` runs
+
+    Built on `sys.settrace`, so every line of every frame calls back into
+    Python. `MonitoringTracer` records the same trace much faster.
+    """
+
     def __init__(self, filepath: pathlib.Path, watched_vars: set[str]):
         self.filepath = filepath
         self.watched_file = filepath.name
         self.watched_vars = watched_vars
-        self.result: list[tuple[int, Snapshot]] = []
+        self.result = Trace()
+        self.op_log: OpLog | None = None
+        self.call_log: CallLog | None = None
 
     def tracer(self, frame, event, arg=None):
         if event != "line":
@@ -58,27 +515,594 @@ class Tracer:
         if filename.endswith(self.watched_file):
             current_line = linecache.getline(filename, lineno)
             current_line = current_line[:-1]  # EAT NEWLINE
-            vars_snapshot = {}
-            for var in self.watched_vars:
-                value = frame.f_locals.get(var)
-                if value:
-                    vars_snapshot[var] = deepcopy(value)
-
-            # print(f"{line_no}: {vars_snapshot}")
-            self.result.append((lineno, Snapshot(vars_snapshot, current_line, lineno)))
+            self.record(frame, current_line, lineno)
 
         return self.tracer  # Return the trace function itself to keep tracing
 
-    def run(self):
+    def record(self, frame, line: str, lineno: int):
+        f_locals = frame.f_locals
+        values = {}
+        for var in self.watched_vars:
+            value = f_locals.get(var)
+            if value:
+                values[var] = value
+        if self.op_log is None:
+            self.result.record(lineno, line, values)
+        else:
+            self.result.record(lineno, line, values, self.op_log.drain(values))
+        if self.call_log is not None:
+            self.call_log.record_step()
+
+    def run(self) -> Trace:
         sys.settrace(self.tracer)
         runpy.run_path(str(self.filepath))
         sys.settrace(None)
         return self.result
 
 
-def trace(filepath, watched_vars):
-    tracer = Tracer(filepath, watched_vars)
-    return tracer.run()
+def is_scalar(value) -> bool:
+    return value is None or type(value) in IMMUTABLE
+
+
+class OpLog:
+    """Collects the ops of traced containers bound to watched variables
+
+    A container's ops describe a step only if the same variable was bound
+    to it at the previous step, and its elements are scalars: an object
+    changed in place never shows up as an op.
+    """
+
+    def __init__(self) -> None:
+        self.bound: dict[str, TracedList | TracedDict] = {}
+        self.flat: dict[int, bool] = {}
+        """Containers that held only scalars so far, by id"""
+
+    def drain(self, values: dict[str, Any]) -> dict[str, tuple[Op, ...]]:
+        """Ops of each variable in `values` since the last step
+
+        Containers whose ops don't describe the step are replaced with plain
+        copies in `values`, so they are compared as a whole.
+        """
+        ops: dict[str, tuple[Op, ...]] = {}
+        taken: dict[int, tuple[Op, ...] | None] = {}
+        bound = {}
+        for varname, value in values.items():
+            if type(value) is not TracedList and type(value) is not TracedDict:
+                continue
+            bound[varname] = value
+            key = id(value)
+            if key not in taken:
+                taken[key] = self.take(value)
+            container_ops = taken[key]
+            if container_ops is not None and self.bound.get(varname) is value:
+                ops[varname] = container_ops
+
+        for varname in bound.keys() - ops.keys():
+            values[varname] = copy(values[varname])
+        # Containers no watched variable holds anymore stop logging
+        for container in self.bound.values():
+            if id(container) not in taken:
+                container.log = None
+                self.flat.pop(id(container), None)
+        self.bound = bound
+        return ops
+
+    def take(self, container: TracedList | TracedDict) -> tuple[Op, ...] | None:
+        log = container.log
+        container.log = []
+        if log is None:
+            # Seen for the first time, earlier changes were not logged
+            elements = (
+                container.values() if type(container) is TracedDict else container
+            )
+            self.flat[id(container)] = all(map(is_scalar, elements))
+            return None
+        if not self.flat[id(container)]:
+            return None
+        for op in log:
+            if op.kind not in ELEMENT_KINDS:
+                return None
+            if not is_scalar(op.new):
+                self.flat[id(container)] = False
+                return None
+        return tuple(coalesce_swaps(log))
+
+
+def arguments(frame) -> dict[str, Any]:
+    code = frame.f_code
+    count = code.co_argcount + code.co_kwonlyargcount
+    count += bool(code.co_flags & inspect.CO_VARARGS)
+    count += bool(code.co_flags & inspect.CO_VARKEYWORDS)
+    f_locals = frame.f_locals
+    return {
+        name: copy_value(f_locals[name])
+        for name in code.co_varnames[:count]
+        if name in f_locals
+    }
+
+
+class CallLog:
+    """Follows the calls of the traced program, records them in `trace`
+
+    Only the program's own functions are followed. The top level is depth
+    0, calls deeper than `max_depth` are not recorded, and neither are
+    their lines, so deep recursion costs nothing past the limit. A trace
+    stores every call once, with its arguments, and one call id per step:
+    the stack of any step is rebuilt from the ids of the callers.
+    """
+
+    def __init__(self, trace: Trace, max_depth: int | None = None):
+        self.trace = trace
+        self.max_depth = math.inf if max_depth is None else max_depth
+        self.frames: list[tuple[FrameType, int]] = []
+        """Frames of the program running, innermost last, with their call
+        id, -1 for the top level and calls too deep to record"""
+        # The top level starting brings it to 0
+        self.depth = -1
+        self.stack: list[int] = []
+        """Ids of the recorded calls running, innermost last"""
+        self.returned: list[tuple[int, Any]] = []
+        self.codes: set[CodeType] = set()
+        """Code objects of the program"""
+
+    def on_start(self, code: CodeType, offset: int):
+        # Generators resuming count as calls too, a yield as a return
+        self.push(code, sys._getframe(1))
+
+    def on_throw(self, code: CodeType, offset: int, exception: BaseException):
+        # Like closing a suspended generator, only enabled globally
+        if code in self.codes:
+            self.push(code, sys._getframe(1))
+
+    def on_return(self, code: CodeType, offset: int, value):
+        self.pop(sys._getframe(1), value)
+
+    def on_unwind(self, code: CodeType, offset: int, exception: BaseException):
+        # Only enabled globally, it comes for every module's code
+        if code in self.codes:
+            self.pop(sys._getframe(1), exception)
+
+    def push(self, code: CodeType, frame: FrameType):
+        self.depth += 1
+        call_id = -1
+        if 0 < self.depth <= self.max_depth:
+            call = Call(
+                len(self.trace.calls),
+                self.stack[-1] if self.stack else -1,
+                code.co_qualname,
+                self.depth,
+                arguments(frame),
+                len(self.trace),
+            )
+            self.trace.calls.append(call)
+            self.stack.append(call.id)
+            call_id = call.id
+        self.frames.append((frame, call_id))
+
+    def pop(self, frame: FrameType, value):
+        # A frame that never started here, ends nothing
+        if not self.frames or self.frames[-1][0] is not frame:
+            return
+        _, call_id = self.frames.pop()
+        self.depth -= 1
+        if call_id != -1:
+            self.stack.pop()
+            self.returned.append((call_id, copy_value(value)))
+
+    def record_step(self):
+        self.trace.call_ids.append(self.stack[-1] if self.stack else -1)
+        if self.returned:
+            self.trace.returns[len(self.trace) - 1] = tuple(self.returned)
+            self.returned = []
+
+
+class MonitoringTracer(Tracer):
+    """Same trace as `Tracer`, recorded through `sys.monitoring`
+
+    The program is compiled here, so LINE events can be enabled on its code
+    objects alone, functions and classes included. Nothing else is
+    instrumented: the interpreter runs stdlib and other modules at full
+    speed, and no callback has to check which file it is in.
+
+    With `log_ops`, the program's lists and dicts are built as traced
+    containers, and steps record the element operations on watched ones.
+    Changed containers then cost as much as their operations, not their
+    size. With `calls`, or a `max_depth`, calls are recorded, see
+    `CallLog`.
+    """
+
+    def __init__(
+        self,
+        filepath: pathlib.Path,
+        watched_vars: set[str],
+        log_ops: bool = False,
+        calls: bool = False,
+        max_depth: int | None = None,
+    ):
+        super().__init__(filepath, watched_vars)
+        self.source = filepath.read_text()
+        self.lines = self.source.splitlines()
+        self.line_tables: dict[CodeType, list[int | None]] = {}
+        if log_ops:
+            self.op_log = OpLog()
+        if calls or max_depth is not None:
+            self.call_log = CallLog(self.result, max_depth)
+
+    def too_deep(self) -> bool:
+        return (
+            self.call_log is not None and self.call_log.depth > self.call_log.max_depth
+        )
+
+    def on_line(self, code: CodeType, lineno: int):
+        if self.too_deep():
+            return
+        # The instrumented frame is the one that called back
+        self.record(sys._getframe(1), self.lines[lineno - 1], lineno)
+
+    def on_jump(self, code: CodeType, offset: int, destination: int):
+        # settrace also reports a loop that jumps back within one line, like
+        # a comprehension, LINE only fires when the line number changes
+        if destination > offset:
+            return sys.monitoring.DISABLE
+        if self.too_deep():
+            return None
+        lines = self.line_tables.get(code)
+        if lines is None:
+            lines = self.line_tables[code] = line_table(code)
+        lineno = lines[destination // 2]
+        if lineno is None or lineno != lines[offset // 2]:
+            return None
+        self.record(sys._getframe(1), self.lines[lineno - 1], lineno)
+        return None
+
+    def run(self) -> Trace:
+        # Same globals as `runpy.run_path` gives the program
+        namespace = {
+            "__name__": "<run_path>",
+            "__file__": str(self.filepath),
+            "__builtins__": builtins,
+        }
+        if self.op_log is None:
+            code = compile(self.source, str(self.filepath), "exec")
+        else:
+            code = instrument(self.source, str(self.filepath))
+            namespace.update(CONSTRUCTORS)
+
+        watched = code_objects(code)
+        events = sys.monitoring.events
+        callbacks: dict[int, Callable[..., object]] = {
+            events.LINE: self.on_line,
+            events.JUMP: self.on_jump,
+        }
+        local_events = events.LINE | events.JUMP
+        if self.call_log is not None:
+            self.call_log.codes = set(watched)
+            callbacks[events.PY_START] = callbacks[events.PY_RESUME] = (
+                self.call_log.on_start
+            )
+            callbacks[events.PY_RETURN] = callbacks[events.PY_YIELD] = (
+                self.call_log.on_return
+            )
+            callbacks[events.PY_THROW] = self.call_log.on_throw
+            callbacks[events.PY_UNWIND] = self.call_log.on_unwind
+            local_events |= events.PY_START | events.PY_RESUME
+            local_events |= events.PY_RETURN | events.PY_YIELD
+        tool_id = claim_tool_id()
+        try:
+            for event, callback in callbacks.items():
+                sys.monitoring.register_callback(tool_id, event, callback)
+            for code_object in watched:
+                sys.monitoring.set_local_events(tool_id, code_object, local_events)
+            if self.call_log is not None:
+                # Can't be enabled per code object
+                sys.monitoring.set_events(tool_id, events.PY_THROW | events.PY_UNWIND)
+            exec(code, namespace)
+        finally:
+            sys.monitoring.set_events(tool_id, events.NO_EVENTS)
+            # Freeing the id leaves events enabled, until 3.14's clear_tool_id
+            for code_object in watched:
+                sys.monitoring.set_local_events(tool_id, code_object, events.NO_EVENTS)
+            for event in callbacks:
+                sys.monitoring.register_callback(tool_id, event, None)
+            sys.monitoring.free_tool_id(tool_id)
+        return self.result
+
+
+def claim_tool_id() -> int:
+    """A free `sys.monitoring` tool id, claimed for algonim
+
+    Each trace running at the same time holds its own.
+    """
+    for tool_id in TOOL_IDS:
+        try:
+            sys.monitoring.use_tool_id(tool_id, "algonim")
+        except ValueError:
+            continue
+        return tool_id
+    raise RuntimeError(
+        "Every sys.monitoring tool id is in use, by debuggers, profilers or "
+        "traces still running"
+    )
+
+
+def code_objects(code: CodeType) -> list[CodeType]:
+    """`code` and every function, class and comprehension nested in it"""
+    found = [code]
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            found.extend(code_objects(const))
+    return found
+
+
+def line_table(code: CodeType) -> list[int | None]:
+    """Line of every instruction in `code`, indexed by offset // 2"""
+    lines: list[int | None] = [None] * (len(code.co_code) // 2)
+    for start, end, lineno in code.co_lines():
+        lines[start // 2 : end // 2] = [lineno] * ((end - start) // 2)
+    return lines
+
+
+# Not an Exception, so the program's `except Exception` does not catch it
+class TraceStopped(BaseException):
+    """Raised into a traced program to stop it"""
+
+
+class StreamingTracer(MonitoringTracer):
+    """`MonitoringTracer` that hands each step over as it is recorded
+
+    Meant to run the program on a thread while another one consumes the
+    steps from `queue`. The queue is bounded, so a program that outpaces
+    its consumer waits instead of racing ahead. The program is stopped
+    from its next line event once `max_steps` are recorded, `timeout`
+    seconds of wall-clock time pass, or the consumer goes away. A program
+    that never reaches a line event, blocked in C code, is abandoned by
+    `steps` once it is past its deadline. A line is recorded only
+    on every `sample_every`-th visit: lines that run on every iteration of
+    a hot loop are sampled on the same iterations.
+    """
+
+    def __init__(
+        self,
+        filepath: pathlib.Path,
+        watched_vars: set[str],
+        max_steps: int | None = None,
+        timeout: float | None = None,
+        sample_every: int = 1,
+        log_ops: bool = False,
+        calls: bool = False,
+        max_depth: int | None = None,
+        max_queued: int = 256,
+    ):
+        super().__init__(filepath, watched_vars, log_ops, calls, max_depth)
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.sample_every = sample_every
+        self.visits: dict[int, int] = {}
+        self.queue: queue.Queue[int | None] = queue.Queue(max_queued)
+        self.deadline = math.inf
+        self.stop_reason: str | None = None
+        self.error: BaseException | None = None
+        self.closed = False
+        """Set by the consumer when it stops reading"""
+        self.abandoned = False
+        """Set by `steps` when the program did not stop in time"""
+
+    def record(self, frame, line: str, lineno: int):
+        if self.stop_reason is None:
+            if self.closed:
+                self.stop_reason = "closed"
+            elif time.monotonic() > self.deadline:
+                self.stop_reason = f"timeout of {self.timeout}s"
+            elif self.max_steps is not None and len(self.result) >= self.max_steps:
+                self.stop_reason = f"max_steps of {self.max_steps}"
+        if self.stop_reason is not None:
+            # Raised again by every line the program runs while unwinding
+            raise TraceStopped(self.stop_reason)
+
+        visits = self.visits.get(lineno, 0)
+        self.visits[lineno] = visits + 1
+        if visits % self.sample_every:
+            return
+        super().record(frame, line, lineno)
+        self.put(len(self.result) - 1)
+
+    def put(self, step: int | None):
+        while not self.closed:
+            try:
+                self.queue.put(step, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+    def steps(self) -> Iterator[int]:
+        """Steps from `queue` until the stream ends, on the consumer's side
+
+        Stops waiting `STOP_GRACE` after the deadline, the program is then
+        abandoned: it still holds its thread, but nothing reads its steps.
+        """
+        while True:
+            remaining = None
+            if self.deadline != math.inf:
+                remaining = max(self.deadline - time.monotonic() + STOP_GRACE, 0)
+            try:
+                step = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                self.closed = True
+                self.abandoned = True
+                return
+            if step is None:
+                return
+            yield step
+
+    def start(self) -> threading.Thread:
+        """Run the program on a daemon thread"""
+        self.deadline = time.monotonic() + (self.timeout or math.inf)
+        thread = threading.Thread(target=self.run_stream, name="algonim-tracer")
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def run_stream(self):
+        """Run the program, errors and budget stops end the stream"""
+        if self.deadline == math.inf:
+            self.deadline = time.monotonic() + (self.timeout or math.inf)
+        try:
+            self.run()
+        except TraceStopped:
+            pass
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.put(None)
+
+
+def cache_key(
+    source: str,
+    watched_vars: set[str],
+    sample_every: int = 1,
+    log_ops: bool = False,
+    calls: bool = False,
+    max_depth: int | None = None,
+) -> str:
+    return trace_key(
+        source,
+        watched_vars,
+        TRACER_VERSION,
+        sample_every,
+        log_ops,
+        calls or max_depth is not None,
+        max_depth,
+    )
+
+
+def trace(
+    filepath,
+    watched_vars,
+    cache: bool = True,
+    log_ops: bool = False,
+    calls: bool = False,
+    max_depth: int | None = None,
+    timeout: float | None = None,
+) -> Trace:
+    """Trace of the whole program, read from the trace cache if it ran before
+
+    Programs are assumed to be deterministic, pass `cache=False` for ones that
+    are not. `log_ops` records element operations on lists and dicts,
+    `calls` and `max_depth` the program's calls, see `MonitoringTracer`.
+    A program still running after `timeout` seconds is stopped, like
+    `iter_trace` does, and raises TimeoutError.
+    """
+    if timeout is None:
+        tracer = MonitoringTracer(filepath, watched_vars, log_ops, calls, max_depth)
+    else:
+        tracer = StreamingTracer(
+            filepath,
+            watched_vars,
+            timeout=timeout,
+            log_ops=log_ops,
+            calls=calls,
+            max_depth=max_depth,
+        )
+    key = None
+    if cache:
+        key = cache_key(tracer.source, watched_vars, 1, log_ops, calls, max_depth)
+        cached = load_trace(key)
+        if isinstance(cached, Trace):
+            return cached
+
+    if isinstance(tracer, StreamingTracer):
+        result = run_in_time(tracer)
+    else:
+        result = tracer.run()
+    if key is not None:
+        store_trace(key, result)
+    return result
+
+
+def run_in_time(tracer: StreamingTracer) -> Trace:
+    """Run the program of `tracer`, raises TimeoutError if it is stopped"""
+    thread = tracer.start()
+    for _ in tracer.steps():
+        pass
+    stop_reason: str | None
+    if tracer.abandoned:
+        stop_reason = f"timeout of {tracer.timeout}s, abandoned"
+    else:
+        thread.join()
+        if tracer.error is not None:
+            raise tracer.error
+        stop_reason = tracer.stop_reason
+    if stop_reason is not None:
+        raise TimeoutError(
+            f"Trace of {tracer.filepath} stopped by {stop_reason}, "
+            f"after {len(tracer.result)} steps"
+        )
+    return tracer.result
+
+
+def iter_trace(
+    filepath,
+    watched_vars,
+    max_steps: int | None = None,
+    timeout: float | None = None,
+    sample_every: int = 1,
+    cache: bool = True,
+    log_ops: bool = False,
+    calls: bool = False,
+    max_depth: int | None = None,
+) -> Generator[tuple[int, Snapshot], None, str | None]:
+    """Same steps as `trace`, yielded while the program runs
+
+    The program runs on a background thread. It is stopped after
+    `max_steps` recorded steps or `timeout` seconds, and the steps recorded
+    until then are still yielded. The timeout is wall-clock time, time the
+    consumer spends between steps included, and it holds for programs
+    blocked in C code too: those are abandoned on their daemon thread. Only every
+    `sample_every`-th visit of a line is recorded. Errors raised by the
+    program are raised here, after the steps before them. Returns why the
+    program was stopped, None if it completed.
+
+    Runs that complete are stored in the trace cache, later calls replay
+    them without running the program.
+    """
+    tracer = StreamingTracer(
+        filepath,
+        watched_vars,
+        max_steps,
+        timeout,
+        sample_every,
+        log_ops,
+        calls,
+        max_depth,
+    )
+    key = None
+    if cache:
+        key = cache_key(
+            tracer.source, watched_vars, sample_every, log_ops, calls, max_depth
+        )
+    cached = load_trace(key) if key is not None else None
+    if isinstance(cached, Trace):
+        if max_steps is not None and max_steps < len(cached):
+            yield from cached.follow(range(max_steps))
+            return f"max_steps of {max_steps}"
+        yield from cached.follow(range(len(cached)))
+        return None
+
+    thread = tracer.start()
+    try:
+        yield from tracer.result.follow(tracer.steps())
+    finally:
+        # Stops the program if the consumer stopped early
+        tracer.closed = True
+    if tracer.abandoned:
+        return f"timeout of {timeout}s, abandoned"
+    thread.join()
+
+    if tracer.error is not None:
+        raise tracer.error
+    if tracer.stop_reason is None and key is not None:
+        store_trace(key, tracer.result)
+    return tracer.stop_reason
 
 
 if __name__ == "__main__":
@@ -0,0 +1,74 @@
+import ctypes
+from collections import deque
+
+from pyglet import gl
+
+
+def read_pixels(width: int, height: int, dest: bytearray):
+    """Synchronously read the current framebuffer into `dest`
+
+    Pixels are RGBA, bottom row first (as OpenGL stores them).
+    """
+    buffer = (ctypes.c_char * len(dest)).from_buffer(dest)
+    gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+    gl.glReadPixels(0, 0, width, height, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, buffer)
+
+
+class PixelBufferRing:
+    """Asynchronous framebuffer readback through a ring of pixel-buffer objects
+
+    `glReadPixels` into a bound GL_PIXEL_PACK_BUFFER returns immediately, the
+    copy happens on the GPU side. A frame is mapped only once the ring is full,
+    so by then the transfer has had `size - 1` frames of time to complete.
+    """
+
+    def __init__(self, width: int, height: int, size: int = 3):
+        self.width = width
+        self.height = height
+        self.size = size
+        self.frame_size = width * height * 4
+
+        self.buffers = (gl.GLuint * size)()
+        gl.glGenBuffers(size, self.buffers)
+        for buffer_id in self.buffers:
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buffer_id)
+            gl.glBufferData(
+                gl.GL_PIXEL_PACK_BUFFER, self.frame_size, None, gl.GL_STREAM_READ
+            )
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+
+        self.next = 0
+        self.in_flight: deque[int] = deque()
+
+    def is_full(self) -> bool:
+        return len(self.in_flight) == self.size
+
+    def push(self):
+        """Start reading the current framebuffer into the next free PBO"""
+        assert not self.is_full(), "pop_into the oldest frame first"
+
+        buffer_id = self.buffers[self.next]
+        self.next = (self.next + 1) % self.size
+
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buffer_id)
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        # With a pack buffer bound, the data pointer is an offset into it
+        gl.glReadPixels(
+            0, 0, self.width, self.height, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, None
+        )
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+        self.in_flight.append(buffer_id)
+
+    def pop_into(self, dest: bytearray):
+        """Copy the oldest in-flight frame into `dest`, bottom row first"""
+        buffer_id = self.in_flight.popleft()
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buffer_id)
+        ptr = gl.glMapBufferRange(
+            gl.GL_PIXEL_PACK_BUFFER, 0, self.frame_size, gl.GL_MAP_READ_BIT
+        )
+        ctypes.memmove((ctypes.c_char * len(dest)).from_buffer(dest), ptr, len(dest))
+        gl.glUnmapBuffer(gl.GL_PIXEL_PACK_BUFFER)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+
+    def delete(self):
+        gl.glDeleteBuffers(self.size, self.buffers)
@@ -0,0 +1,202 @@
+import importlib.util
+from collections.abc import Iterator
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import pyglet
+
+from algonim.encoder import EncoderThread, FFmpegWriter
+from algonim.framebuffer import OffscreenTarget
+from algonim.readback import PixelBufferRing, read_pixels
+from algonim.script import ScriptExecutor
+from algonim.time_utils import FrameProfiler, Timer
+from algonim.window import AppWindow
+
+RESOLUTIONS = {
+    "360p": (640, 360),
+    "720p": (1280, 720),
+    "fullhd": (1920, 1080),
+    "4k": (3840, 2160),
+}
+"""Output resolution presets, scripts always use the window's coordinates"""
+
+
+@dataclass
+class RenderSettings:
+    output: str = "output.mp4"
+    fps: int = 60
+    resolution: tuple[int, int] | None = None
+    """Output size in pixels, None to match the window"""
+    supersample: int = 1
+    frames: range | None = None
+    """Render only these frames, None for the whole script"""
+    crf: int = 10
+    preset: str = "medium"
+    """libx264 preset, speed vs compression tradeoff"""
+    trace: str | None = None
+    """Path to write a Chrome trace of per-frame stage timings to"""
+
+    def as_draft(self) -> "RenderSettings":
+        """Low resolution, frame rate and encoder effort, for checking timing"""
+        return replace(
+            self,
+            fps=15,
+            resolution=RESOLUTIONS["360p"],
+            crf=28,
+            preset="ultrafast",
+        )
+
+    def output_size(self, window: AppWindow) -> tuple[int, int]:
+        return self.resolution or (window.width, window.height)
+
+    def frame_range(self, script_exec: ScriptExecutor) -> range:
+        return self.frames or range(script_exec.frame_count(self.fps))
+
+
+def load_script(path: Path):
+    spec = importlib.util.spec_from_file_location("videoscript", path)
+
+    if spec is None or spec.loader is None:
+        raise RuntimeError(f"Cannot load script from {path}")
+
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    if not hasattr(module, "build_script"):
+        raise RuntimeError(f"{path} must define build_script(window)")
+
+    return module.build_script
+
+
+def exec_preview(script_exec: ScriptExecutor):
+    script_exec.start()
+    pyglet.app.run()
+
+
+def iter_frames(
+    script_exec: ScriptExecutor, settings: RenderSettings, profiler: FrameProfiler
+) -> Iterator[bool]:
+    """Seek the script to each frame to draw
+
+    Yields False if the frame is identical to the previous one, so it can be
+    reused without drawing or reading back. The consumer's work on a frame is
+    timed as part of its `frame` stage.
+    """
+    frames = settings.frame_range(script_exec)
+
+    for index in frames:
+        with profiler.stage("frame"):
+            with profiler.stage("update"):
+                changed = script_exec.seek(index / settings.fps)
+            changed = changed or index == frames.start
+            profiler.reused += not changed
+            yield changed
+        profiler.end_frame()
+
+
+def draw_frame(window: AppWindow, target: OffscreenTarget, profiler: FrameProfiler):
+    """Draw the current state of the script into `target`"""
+    with profiler.stage("draw"):
+        window.dispatch_events()
+        target.bind()
+        # Not `dispatch_event("on_draw")`: outside of `dispatch_events` it only
+        # queues the event, and the frame would be drawn late
+        window.on_draw()
+
+    with profiler.stage("resolve"):
+        target.resolve()
+        if window.visible:
+            target.blit_to_window(*window.get_framebuffer_size())
+
+    with profiler.stage("flush"):
+        # Window without `double_buffer` shows the blit after flush, no `flip`
+        pyglet.gl.glFlush()
+
+
+def finish_profile(profiler: FrameProfiler, settings: RenderSettings):
+    profiler.summary()
+    if settings.trace is not None:
+        profiler.write_trace(settings.trace)
+        print(f"Trace written to {settings.trace}")
+
+
+def exec_video_renderer(
+    window: AppWindow, script_exec: ScriptExecutor, settings: RenderSettings
+):
+    width, height = settings.output_size(window)
+    writer = FFmpegWriter(
+        settings.output, width, height, settings.fps, settings.crf, settings.preset
+    )
+    frame = bytearray(width * height * 4)
+    profiler = FrameProfiler("render_frames", len(settings.frame_range(script_exec)))
+
+    window.switch_to()
+    target = OffscreenTarget(width, height, settings.supersample)
+
+    for changed in iter_frames(script_exec, settings, profiler):
+        if changed:
+            draw_frame(window, target, profiler)
+            with profiler.stage("readback"):
+                read_pixels(width, height, frame)
+        with profiler.stage("encode"):
+            writer.write(frame)
+
+    target.unbind()
+    target.delete()
+
+    window.set_visible(False)
+    writer.close()
+    finish_profile(profiler, settings)
+
+
+def exec_pipelined_renderer(
+    window: AppWindow, script_exec: ScriptExecutor, settings: RenderSettings
+):
+    """Same output as `exec_video_renderer`, but stages overlap
+
+    Readback goes through a ring of PBOs and encoding runs on a background
+    thread, so drawing frame N overlaps with encoding frame N-1.
+    """
+    width, height = settings.output_size(window)
+    writer = FFmpegWriter(
+        settings.output, width, height, settings.fps, settings.crf, settings.preset
+    )
+    profiler = FrameProfiler("render_frames", len(settings.frame_range(script_exec)))
+    encoder = EncoderThread(writer, frame_size=width * height * 4, profiler=profiler)
+
+    def submit_oldest():
+        frame = encoder.acquire()
+        with profiler.stage("copy"):
+            readback.pop_into(frame)
+        encoder.submit(frame)
+
+    window.switch_to()
+    target = OffscreenTarget(width, height, settings.supersample)
+    readback = PixelBufferRing(width, height)
+    encoder.start()
+
+    for changed in iter_frames(script_exec, settings, profiler):
+        if not changed:
+            # The frame to repeat may still be in flight
+            while readback.in_flight:
+                submit_oldest()
+            encoder.repeat()
+            continue
+
+        draw_frame(window, target, profiler)
+
+        if readback.is_full():
+            submit_oldest()
+        with profiler.stage("readback"):
+            readback.push()
+
+    while readback.in_flight:
+        submit_oldest()
+    readback.delete()
+    target.unbind()
+    target.delete()
+
+    window.set_visible(False)
+    with Timer("encoder_flush"):
+        encoder.close()
+    finish_profile(profiler, settings)
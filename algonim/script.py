@@ -1,41 +1,164 @@
+import math
 from collections.abc import Callable
+from itertools import accumulate
 
 import pyglet
 
 from algonim.easing import ease_in_out_cubic, ease_linear, ease_out_cubic, lerp
 from algonim.time_utils import Timer
 
-type ActionFn = Callable[[float], bool]
-"""Represents an animated action
 
-Args:
-    value (float): Delta time (in seconds) since the last call
+class Action:
+    """Animated action with a duration known up front
 
-Returns:
-    bool: True if the animation is completed, False otherwise
-"""
+    Actions are evaluated at a point in time instead of being advanced by
+    deltas, so any frame can be computed without replaying the ones before it.
+    `begin` is called once when the action starts, then `update` is called with
+    the local time in seconds: non-decreasing, clamped to [0, duration].
+    `update` returns True if it may have changed anything on screen.
+    """
+
+    duration: float = 0.0
+
+    def begin(self) -> None:
+        pass
+
+    def update(self, t: float) -> bool:
+        return False
+
+
+class Tween(Action):
+    def __init__(self, duration: float, apply: Callable[[float], None], ease):
+        self.duration = duration
+        self.apply = apply
+        self.ease = ease
+
+    def update(self, t: float) -> bool:
+        u = 1.0 if self.duration <= 0 else min(1.0, t / self.duration)
+        self.apply(self.ease(u))
+        return True
+
+
+class Instant(Action):
+    def __init__(self, fn: Callable[[], None]):
+        self.fn = fn
+
+    def update(self, t: float) -> bool:
+        # Zero duration, so the timeline updates it exactly once
+        self.fn()
+        return True
+
+
+class Wait(Action):
+    def __init__(self, duration: float):
+        self.duration = duration
+
+
+class Deferred(Action):
+    def __init__(self, factory: Callable[[], Action], duration: float):
+        self.factory = factory
+        self.duration = duration
+        self.action: Action | None = None
+
+    def begin(self) -> None:
+        self.action = self.factory()
+        self.action.begin()
+
+    def update(self, t: float) -> bool:
+        assert self.action is not None
+        return self.action.update(t)
+
+
+class Parallel(Action):
+    def __init__(self, actions: tuple[Action, ...]):
+        self.actions = actions
+        self.duration = max((action.duration for action in actions), default=0.0)
+        self.remaining: list[Action] = []
+
+    def begin(self) -> None:
+        self.remaining = list(self.actions)
+        for action in self.actions:
+            action.begin()
+
+    def update(self, t: float) -> bool:
+        changed = False
+        for action in list(self.remaining):
+            changed |= action.update(min(t, action.duration))
+            if t >= action.duration:
+                self.remaining.remove(action)
+        return changed
+
+
+class Seq(Action):
+    def __init__(self, actions: tuple[Action, ...]):
+        self.actions = actions
+        self.starts = list(accumulate((a.duration for a in actions), initial=0.0))
+        self.duration = self.starts[-1]
+        self.index = 0
+        self.started = False
+
+    def is_complete(self) -> bool:
+        return self.index >= len(self.actions)
+
+    def update(self, t: float) -> bool:
+        # Every action that ended by `t` gets its final update, in order, so
+        # zero-duration actions never take a frame of their own
+        changed = False
+        while not self.is_complete():
+            action = self.actions[self.index]
+            if not self.started:
+                action.begin()
+                self.started = True
+
+            local_t = t - self.starts[self.index]
+            if local_t < action.duration:
+                changed |= action.update(local_t)
+                return changed
+
+            changed |= action.update(action.duration)
+            self.index += 1
+            self.started = False
+
+        return changed
 
 
 class Script:
     def __init__(self) -> None:
-        self.steps: list[ActionFn] = []
+        self.steps: list[Action] = []
         # TODO: typing
         self.actors = []  # type: ignore
+        self.layers: dict[int, int] = {}
+
+    @property
+    def duration(self) -> float:
+        return sum(step.duration for step in self.steps)
 
-    def do(self, *actions: ActionFn):
+    def do(self, *actions: Action):
         if len(actions) == 1:
             self.steps.append(actions[0])
         else:
             self.steps.append(parallel(*actions))
 
-    def register(self, actor):
+    def register(self, actor, layer: int = 0):
+        """Show `actor` on screen, higher layers are drawn on top"""
+        if id(actor) in self.layers:
+            return
         self.actors.append(actor)
+        self.layers[id(actor)] = layer
 
 
 class ScriptExecutor:
+    """Plays script steps back to back on a single timeline
+
+    Seeking is forward only: steps keep their progress, so going back in time
+    would need the initial state of every actor.
+    """
+
     def __init__(self, script: Script):
         self.script = script
-        self.index = 0
+        self.timeline = Seq(tuple(script.steps))
+        self.duration = self.timeline.duration
+        self.time = 0.0
 
     def start(self):
         pyglet.clock.schedule(self.execute_current_action)
@@ -44,7 +167,19 @@ class ScriptExecutor:
         pyglet.clock.unschedule(self.execute_current_action)
 
     def is_complete(self):
-        return self.index >= len(self.script.steps)
+        return self.timeline.is_complete()
+
+    def frame_count(self, fps: int) -> int:
+        """Frames needed to show the whole script, frame `i` is at `i / fps`"""
+        # Tolerance keeps e.g. 7.000000001 frames worth of float error at 7
+        return math.ceil(self.duration * fps - 1e-6) + 1
+
+    def seek(self, t: float) -> bool:
+        """Returns False if nothing on screen changed since the previous seek"""
+        if t < self.time:
+            raise ValueError(f"Can't seek back from {self.time:.3f}s to {t:.3f}s")
+        self.time = t
+        return self.timeline.update(min(t, self.duration))
 
     def execute_current_action(self, delta: float):
         if self.is_complete():
@@ -52,177 +187,94 @@ class ScriptExecutor:
             print("Script complete")
             return
 
-        action = self.script.steps[self.index]
-        is_action_complete = action(delta)
-        if is_action_complete:
-            self.index += 1
+        self.seek(self.time + delta)
 
 
 def write_script(window, script_writer) -> ScriptExecutor:
     with Timer("script_writer"):
         script = script_writer()
 
-    window.objects.extend(script.actors)
+    for actor in script.actors:
+        window.add(actor, script.layers[id(actor)])
     script_exec = ScriptExecutor(script)
     return script_exec
 
 
-def fade_in(obj, duration=1.0, ease=ease_linear) -> ActionFn:
-    elapsed = 0.0
-
-    def action(dt):
-        nonlocal elapsed
-        elapsed += dt
-        u = min(1.0, elapsed / duration)
-        a = int(255 * ease(u))
-        obj.set_alpha(a)
-        return u >= 1.0
+def fade_in(obj, duration=1.0, ease=ease_linear) -> Action:
+    return Tween(duration, lambda e: obj.set_alpha(int(255 * e)), ease)
 
-    return action
 
+def grow_in(obj, duration=0.5, ease=ease_linear) -> Action:
+    return Tween(duration, lambda e: obj.set_height(int(60 * e)), ease)
 
-def grow_in(obj, duration=0.5, ease=ease_linear) -> ActionFn:
-    elapsed = 0.0
 
-    def action(dt):
-        nonlocal elapsed
-        elapsed += dt
-        u = min(1.0, elapsed / duration)
-        a = int(60 * ease(u))
-        obj.set_height(a)
-        return u >= 1.0
+def grow_out(obj, duration=0.5, ease=ease_linear) -> Action:
+    return Tween(duration, lambda e: obj.set_height(int(60 * (1.0 - e))), ease)
 
-    return action
 
-
-def grow_out(obj, duration=0.5, ease=ease_linear) -> ActionFn:
-    elapsed = 0.0
-
-    def action(dt):
-        nonlocal elapsed
-        elapsed += dt
-        u = min(1.0, elapsed / duration)
-        a = int(60 * (1.0 - ease(u)))
-        obj.set_height(a)
-        return u >= 1.0
-
-    return action
-
-
-def drop_in(obj) -> ActionFn:
+def drop_in(obj) -> Action:
     return parallel(
         fade_in(obj),
         move_down(obj, 100, 1, ease=ease_out_cubic),
     )
 
 
-def drop_out(obj) -> ActionFn:
+def drop_out(obj) -> Action:
     return parallel(
         fade_out(obj, ease=ease_out_cubic),
         move_down(obj, 100, 1, ease=ease_out_cubic),
     )
 
 
-def fade_out(obj, duration=1.0, ease=ease_linear) -> ActionFn:
-    elapsed = 0.0
-
-    def action(dt):
-        nonlocal elapsed
-        elapsed += dt
-        u = min(1.0, elapsed / duration)
-        a = int(255 * (1.0 - ease(u)))
-        obj.set_alpha(a)
-        return u >= 1.0
+def fade_out(obj, duration=1.0, ease=ease_linear) -> Action:
+    return Tween(duration, lambda e: obj.set_alpha(int(255 * (1.0 - e))), ease)
 
-    return action
-
-
-def tween_xy(
-    obj, start_x, start_y, end_x, end_y, duration, ease=ease_linear
-) -> ActionFn:
-    t = 0.0
-
-    def action(dt):
-        nonlocal t
-        t += dt
-        u = min(1.0, t / duration)
-        e = ease(u)
 
+def tween_xy(obj, start_x, start_y, end_x, end_y, duration, ease=ease_linear) -> Action:
+    def apply(e):
         obj.set_x(lerp(start_x, end_x, e))
         obj.set_y(lerp(start_y, end_y, e))
 
-        return u >= 1.0
-
-    return action
+    return Tween(duration, apply, ease)
 
 
-def move_to(obj, x, y, duration, ease=ease_linear) -> ActionFn:
+def move_to(obj, x, y, duration, ease=ease_linear) -> Action:
     start_x = obj.x
     start_y = obj.y
     return tween_xy(obj, start_x, start_y, x, y, duration, ease)
 
 
-def move_by(obj, dx, dy, duration, ease=ease_linear) -> ActionFn:
-    return defer(lambda: move_to(obj, obj.x + dx, obj.y + dy, duration, ease))
+def move_by(obj, dx, dy, duration, ease=ease_linear) -> Action:
+    return defer(lambda: move_to(obj, obj.x + dx, obj.y + dy, duration, ease), duration)
 
 
-def move_up(obj, amount, seconds, ease=ease_in_out_cubic) -> ActionFn:
+def move_up(obj, amount, seconds, ease=ease_in_out_cubic) -> Action:
     return move_by(obj, 0, amount, seconds, ease)
 
 
-def move_down(obj, amount, seconds, ease=ease_in_out_cubic) -> ActionFn:
+def move_down(obj, amount, seconds, ease=ease_in_out_cubic) -> Action:
     return move_by(obj, 0, -amount, seconds, ease)
 
 
-def defer(factory) -> ActionFn:
-    "Late binding"
-
-    action = None
-
-    def run(dt):
-        nonlocal action
-        if action is None:
-            action = factory()
-        return action(dt)
-
-    return run
-
-
-def parallel(*actions: ActionFn) -> ActionFn:
-    remaining = set(actions)
-
-    def combined_action(delta: float):
-        for action in list(remaining):
-            if action(delta):
-                remaining.remove(action)
-
-        return len(remaining) == 0
-
-    return combined_action
-
+def defer(factory: Callable[[], Action], duration: float) -> Action:
+    """Late binding, `factory` runs when the action starts
 
-def seq(*actions: ActionFn) -> ActionFn:
-    index = 0
+    The duration has to be known up front, before the action is created.
+    """
+    return Deferred(factory, duration)
 
-    def combined_action(dt: float):
-        nonlocal index
 
-        current_action = actions[index]
-        is_complete = current_action(dt)
-        if is_complete:
-            index += 1
+def instant(fn: Callable[[], None]) -> Action:
+    return Instant(fn)
 
-        return index >= len(actions)
 
-    return combined_action
+def parallel(*actions: Action) -> Action:
+    return Parallel(actions)
 
 
-def wait(duration: float) -> ActionFn:
-    elapsed_time = 0.0
+def seq(*actions: Action) -> Action:
+    return Seq(actions)
 
-    def action(dt: float):
-        nonlocal elapsed_time
-        elapsed_time += dt
-        return elapsed_time >= duration
 
-    return action
+def wait(duration: float) -> Action:
+    return Wait(duration)
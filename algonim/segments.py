@@ -0,0 +1,58 @@
+import subprocess
+import sys
+import tempfile
+from itertools import pairwise
+from pathlib import Path
+
+from algonim.encoder import concat_videos
+from algonim.time_utils import Timer
+
+
+def split_frames(frames: range, jobs: int) -> list[range]:
+    """Split `frames` into at most `jobs` contiguous, near-equal ranges"""
+    jobs = max(1, min(jobs, len(frames)))
+    bounds = [frames.start + len(frames) * i // jobs for i in range(jobs + 1)]
+    return [range(start, stop) for start, stop in pairwise(bounds)]
+
+
+def render_segments(
+    script_path: str,
+    frames: range,
+    jobs: int,
+    output: str,
+    worker_args: list[str],
+):
+    """Render parts of `frames` in parallel worker processes and join them
+
+    Every worker is a separate `python -m algonim render --frames` process with
+    its own GL context. Rendering is deterministic, so each frame is identical
+    to the one a serial render would produce. Segments are joined with
+    ffmpeg's concat demuxer, without re-encoding.
+    """
+    ranges = split_frames(frames, jobs)
+
+    with Timer("render_segments"), tempfile.TemporaryDirectory() as tmp:
+        segments = [str(Path(tmp) / f"segment_{i:04}.mp4") for i in range(len(ranges))]
+        workers = [
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "algonim",
+                    "render",
+                    script_path,
+                    "--frames",
+                    f"{frames.start}:{frames.stop}",
+                    "--output",
+                    segment,
+                    *worker_args,
+                ]
+            )
+            for frames, segment in zip(ranges, segments, strict=True)
+        ]
+
+        failed = [worker.args for worker in workers if worker.wait() != 0]
+        if failed:
+            raise RuntimeError(f"{len(failed)} render workers failed: {failed}")
+
+        concat_videos(segments, output)
@@ -0,0 +1,115 @@
+"""pyglet's default shape and text shaders, plus an `opacity` uniform
+
+Actors drawn with these programs fade by changing one uniform, not by
+rewriting the color of every vertex. The fragment sources are derived from
+pyglet's own, so everything else renders exactly as with the defaults.
+"""
+
+import pyglet
+from pyglet import gl
+from pyglet.graphics.shader import ShaderProgram
+from pyglet.text.layout import base as layout_base
+
+OPACITY_UNIFORM = "uniform float opacity = 1.0;\n\n    void main()"
+
+
+def with_opacity(source: str, old: str, new: str) -> str:
+    assert old in source, "pyglet's default shader changed"
+    return source.replace("void main()", OPACITY_UNIFORM, 1).replace(old, new)
+
+
+SHAPE_FRAGMENT_SOURCE = with_opacity(
+    pyglet.shapes.fragment_source,
+    "final_color = vertex_colors;",
+    "final_color = vec4(vertex_colors.rgb, vertex_colors.a * opacity);",
+)
+
+TEXT_FRAGMENT_SOURCE = with_opacity(
+    layout_base.layout_fragment_source,
+    "texture(text, texture_coords).a * text_colors.a",
+    "texture(text, texture_coords).a * text_colors.a * opacity",
+)
+
+
+def create_program(vertex_source: str, fragment_source: str) -> ShaderProgram:
+    # Programs are cached by the context, repeated calls are cheap
+    context = pyglet.gl.current_context
+    assert context is not None, "No GL context"
+    return context.create_program(
+        (vertex_source, "vertex"), (fragment_source, "fragment")
+    )
+
+
+def shape_program() -> ShaderProgram:
+    return create_program(pyglet.shapes.vertex_source, SHAPE_FRAGMENT_SOURCE)
+
+
+def text_program() -> ShaderProgram:
+    return create_program(layout_base.layout_vertex_source, TEXT_FRAGMENT_SOURCE)
+
+
+CHART_VERTEX_SOURCE = """#version 330 core
+    in vec2 corner;
+    in float index;
+    in float value;
+    in vec4 colors;
+
+    out vec4 vertex_colors;
+
+    uniform WindowBlock
+    {
+        mat4 projection;
+        mat4 view;
+    } window;
+
+    // Geometry comes from the value, the CPU only writes one float per vertex
+    uniform float first;
+    uniform vec2 origin;
+    uniform vec2 cell;
+    uniform float gap;
+    uniform float max_value;
+    uniform bool heat;
+    uniform vec4 low;
+    uniform vec4 high;
+
+    void main()
+    {
+        float t = clamp(value / max_value, 0.0, 1.0);
+        float x = first + index + gap / 2.0 + corner.x * (1.0 - gap);
+        float height = heat ? cell.y : t * cell.y;
+        vec2 position = origin + vec2(x * cell.x, corner.y * height);
+
+        gl_Position = window.projection * window.view * vec4(position, 0.0, 1.0);
+        vertex_colors = heat ? mix(low, high, t) * colors : colors;
+    }
+"""
+
+
+def chart_program() -> ShaderProgram:
+    return create_program(CHART_VERTEX_SOURCE, SHAPE_FRAGMENT_SOURCE)
+
+
+current_opacity = 1.0
+
+
+def set_opacity(opacity: float):
+    global current_opacity
+    current_opacity = opacity
+    for program in (shape_program(), text_program(), chart_program()):
+        program["opacity"] = opacity
+
+
+class ShapeGroup(pyglet.graphics.ShaderGroup):
+    """Binds a shape program with alpha blending, as pyglet's shapes do
+
+    For actors that build their own vertex lists instead of using shapes.
+    """
+
+    def set_state(self):
+        super().set_state()
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+
+    def unset_state(self):
+        gl.glDisable(gl.GL_BLEND)
+        super().unset_state()
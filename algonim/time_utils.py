@@ -1,4 +1,8 @@
+import json
+import os
+import threading
 import time
+from collections import defaultdict
 
 
 class Timer:
@@ -14,3 +18,96 @@ class Timer:
         end = time.perf_counter()
         elapsed = end - self.start
         print(f"<{self.name}>: Took {elapsed:.3f} seconds")
+
+
+class Stage:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "FrameProfiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end = time.perf_counter_ns()
+        self.profiler.events.append(
+            (self.name, threading.get_ident(), self.start, end - self.start)
+        )
+
+
+class FrameProfiler:
+    """Per-stage timings of a render
+
+    Stages can nest and run on any thread, e.g. `frame` wraps `update` and
+    `draw`, while `encode` runs on the encoder thread. GL calls are
+    asynchronous, so a stage that submits work (`draw`) is cheap and the
+    wait shows up in the next stage that syncs with the GPU (`readback`).
+    """
+
+    def __init__(self, name: str, total_frames: int, report_interval: float = 5.0):
+        self.name = name
+        self.total_frames = total_frames
+        self.report_interval = report_interval
+        self.events: list[tuple[str, int, int, int]] = []
+        self.frames = 0
+        self.reused = 0
+        """Frames repeated from the previous one, not drawn"""
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def stage(self, name: str) -> Stage:
+        return Stage(self, name)
+
+    def end_frame(self):
+        self.frames += 1
+        now = time.perf_counter()
+        if now - self.last_report >= self.report_interval:
+            self.last_report = now
+            fps = self.frames / (now - self.start)
+            eta = (self.total_frames - self.frames) / fps
+            print(
+                f"<{self.name}>: {self.frames}/{self.total_frames} frames, "
+                f"{fps:.1f} fps, ETA {eta:.0f}s"
+            )
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        print(
+            f"<{self.name}>: {self.frames} frames in {elapsed:.3f} seconds, "
+            f"{self.frames / elapsed:.1f} fps, {self.reused} reused"
+        )
+
+        # Events are recorded when stages end, sort so outer stages go first
+        durations: dict[str, list[int]] = defaultdict(list)
+        for name, _, _, duration in sorted(self.events, key=lambda e: e[2]):
+            durations[name].append(duration)
+
+        print(f"{'stage':<12} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for name, values in durations.items():
+            values.sort()
+            p50 = values[len(values) // 2] / 1e6
+            p95 = values[min(len(values) - 1, len(values) * 95 // 100)] / 1e6
+            print(
+                f"{name:<12} {len(values):>7} {p50:>8.3f} {p95:>8.3f} "
+                f"{values[-1] / 1e6:>8.3f}"
+            )
+
+    def write_trace(self, path: str):
+        """Write Chrome trace-event JSON, open in chrome://tracing or Perfetto"""
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": start / 1000,
+                "dur": duration / 1000,
+                "pid": pid,
+                "tid": tid,
+            }
+            for name, tid, start, duration in self.events
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,65 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any
+
+
+def cache_dir() -> Path:
+    """`$ALGONIM_CACHE_DIR`, or algonim's directory in the XDG cache"""
+    if path := os.environ.get("ALGONIM_CACHE_DIR"):
+        return Path(path)
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "algonim"
+
+
+def trace_key(source: str, watched_vars: set[str], *options) -> str:
+    """Hash of everything a trace depends on
+
+    `options` include the tracer's version. Anything that changes gets a new
+    key, so stale entries are never read.
+    """
+    digest = hashlib.sha256()
+    for part in (sys.version, *options, sorted(watched_vars), source):
+        digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def trace_path(key: str) -> Path:
+    return cache_dir() / "traces" / f"{key}.pickle"
+
+
+def load_trace(key: str) -> Any | None:
+    try:
+        with open(trace_path(key), "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Truncated or unreadable, a miss, overwritten by the next store
+        return None
+
+
+def store_trace(key: str, trace) -> bool:
+    """Returns False if the trace holds values that can't be pickled"""
+    try:
+        data = pickle.dumps(trace, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        # Like instances of classes defined by the traced program
+        return False
+
+    path = trace_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written aside and renamed, so concurrent runs never read half a file
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return True
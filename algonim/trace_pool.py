@@ -0,0 +1,410 @@
+import math
+import multiprocessing
+import os
+import pathlib
+import threading
+import time
+import traceback
+from array import array
+from collections import deque
+from collections.abc import Iterator
+from multiprocessing.connection import Connection, wait
+from typing import Any
+
+from algonim.python_tracer import (
+    Call,
+    Delta,
+    Snapshot,
+    StreamingTracer,
+    Trace,
+    cache_key,
+)
+from algonim.trace_cache import load_trace, store_trace
+from algonim.traced_containers import Op
+
+try:
+    import resource
+except ImportError:  # Windows, traces run there without a memory limit
+    resource = None  # type: ignore[assignment]
+
+BATCH_STEPS = 256
+"""Most steps a worker sends in one message"""
+BATCH_SECONDS = 0.05
+"""How often a worker sends the steps it has not sent yet"""
+KILL_GRACE = 2.0
+"""Seconds past its timeout a worker gets to stop by itself before it is killed"""
+
+type Batch = tuple[
+    array,
+    dict[int, str],
+    list[Delta | None],
+    list[tuple[int, dict[str, Any]]],
+    dict[int, dict[str, tuple[Op, ...]]],
+    list[Call],
+    array,
+    dict[int, tuple[tuple[int, Any], ...]],
+]
+"""Arguments of `Trace.extend`"""
+
+
+class PipeTracer(StreamingTracer):
+    """Sends the recorded steps to the parent process in batches
+
+    Batches are slices of the worker's trace, keyframes included, so the
+    parent extends its copy without replaying any delta.
+    """
+
+    def __init__(self, conn: Connection, *args, **options):
+        super().__init__(*args, **options)
+        self.conn = conn
+        self.sent = 0
+        self.sent_keyframes = 1
+        self.sent_calls = 0
+        self.lock = threading.Lock()
+        """Held while a step is recorded or a batch is sent"""
+
+    def record(self, frame, line: str, lineno: int):
+        with self.lock:
+            super().record(frame, line, lineno)
+
+    def put(self, step: int | None):
+        if step is None:
+            with self.lock:
+                self.send()
+        elif step + 1 - self.sent >= BATCH_STEPS:
+            self.send()
+
+    def flush(self, stopped: threading.Event):
+        """Send the steps left in a batch every `BATCH_SECONDS`, on a thread
+
+        So the steps of a program blocked in a call, or slow between its
+        lines, are not held back until it is killed.
+        """
+        while not stopped.wait(BATCH_SECONDS):
+            with self.lock:
+                if self.sent < len(self.result):
+                    self.send()
+
+    def send(self):
+        self.conn.send(("steps", self.batch()))
+
+    def batch(self) -> Batch:
+        trace = self.result
+        stop = len(trace)
+        linenos = trace.linenos[self.sent : stop]
+        line_text = {lineno: trace.line_text[lineno] for lineno in set(linenos)}
+        deltas = trace.deltas[self.sent : stop]
+        keyframes = list(
+            zip(
+                trace.keyframe_steps[self.sent_keyframes :],
+                trace.keyframes[self.sent_keyframes :],
+                strict=True,
+            )
+        )
+        ops = {
+            step: trace.ops[step]
+            for step in range(self.sent, stop)
+            if step in trace.ops
+        }
+        calls = trace.calls[self.sent_calls :]
+        call_ids = trace.call_ids[self.sent : stop]
+        returns = {
+            step: trace.returns[step]
+            for step in range(self.sent, stop)
+            if step in trace.returns
+        }
+        self.sent = stop
+        self.sent_keyframes = len(trace.keyframes)
+        self.sent_calls += len(calls)
+        return linenos, line_text, deltas, keyframes, ops, calls, call_ids, returns
+
+
+def run_worker(
+    conn: Connection,
+    filepath: str,
+    watched_vars: set[str],
+    max_steps: int | None,
+    timeout: float | None,
+    sample_every: int,
+    options: dict[str, Any],
+    memory_limit: int | None,
+):
+    """Entry point of a worker process, traces one program
+
+    `options` are the keyword arguments of `StreamingTracer`.
+    """
+    if memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    tracer = PipeTracer(
+        conn,
+        pathlib.Path(filepath),
+        watched_vars,
+        max_steps,
+        timeout,
+        sample_every,
+        **options,
+    )
+    stopped = threading.Event()
+    flusher = threading.Thread(target=tracer.flush, args=(stopped,), daemon=True)
+    flusher.start()
+    tracer.run_stream()
+    stopped.set()
+    flusher.join()
+    error = None
+    if tracer.error is not None:
+        error = "".join(traceback.format_exception(tracer.error))
+    conn.send(("end", error, tracer.stop_reason))
+    conn.close()
+
+
+class RemoteTrace:
+    """Trace recorded by a worker process, filled in as its steps arrive
+
+    Iterating yields the steps as they come in, `result` waits for all of
+    them. Both raise RuntimeError if the program failed.
+    """
+
+    def __init__(
+        self,
+        filepath: pathlib.Path,
+        watched_vars: set[str],
+        max_steps: int | None = None,
+        sample_every: int = 1,
+        options: dict[str, Any] | None = None,
+    ):
+        self.filepath = filepath
+        self.watched_vars = watched_vars
+        self.max_steps = max_steps
+        self.sample_every = sample_every
+        self.options = options or {}
+        """`log_ops`, `calls` and `max_depth`, as `iter_trace` takes them"""
+        self.key: str | None = None
+        """Cache key the trace is stored under once complete"""
+        self.trace = Trace()
+        self.done = False
+        self.error: str | None = None
+        self.stop_reason: str | None = None
+        self.changed = threading.Condition()
+
+        # Set by the pool while the worker runs
+        self.process: multiprocessing.process.BaseProcess | None = None
+        self.conn: Connection | None = None
+        self.kill_at = math.inf
+
+    def add_steps(self, batch: Batch):
+        with self.changed:
+            self.trace.extend(*batch)
+            self.changed.notify_all()
+
+    def finish(self, error: str | None = None, stop_reason: str | None = None):
+        with self.changed:
+            self.error = error
+            self.stop_reason = stop_reason
+            self.done = True
+            self.changed.notify_all()
+
+        if stop_reason is None and error is None and self.key is not None:
+            store_trace(self.key, self.trace)
+
+    def steps(self) -> Iterator[int]:
+        step = 0
+        while True:
+            with self.changed:
+                while step >= len(self.trace) and not self.done:
+                    self.changed.wait()
+                stop = len(self.trace)
+                done = self.done
+            yield from range(step, stop)
+            step = stop
+            if done:
+                return
+
+    def check(self):
+        if self.error is not None:
+            raise RuntimeError(f"Tracing {self.filepath} failed\n{self.error}")
+
+    def __iter__(self) -> Iterator[tuple[int, Snapshot]]:
+        yield from self.trace.follow(self.steps())
+        self.check()
+
+    def result(self) -> Trace:
+        with self.changed:
+            while not self.done:
+                self.changed.wait()
+        self.check()
+        return self.trace
+
+
+class TracePool:
+    """Traces programs in worker processes, `processes` of them at a time
+
+    Every trace gets a fresh process. `timeout` is wall-clock time, like for
+    `iter_trace`: a program past it stops at its next line, or is killed
+    `KILL_GRACE` later, even blocked in C code, without taking other traces
+    down. `memory_limit` (bytes of address space) applies to each program
+    alone.
+    Steps stream back to this process while the programs run. Complete
+    traces go through the trace cache like `trace` does. Leaving a `with`
+    block waits for the submitted traces, see `close`.
+    """
+
+    def __init__(
+        self,
+        processes: int | None = None,
+        timeout: float | None = None,
+        memory_limit: int | None = None,
+    ):
+        self.processes = processes or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        # Forking a process that holds a GL context or threads is unsafe
+        self.context = multiprocessing.get_context("spawn")
+        self.pending: deque[RemoteTrace] = deque()
+        self.running: dict[Connection, RemoteTrace] = {}
+        self.has_work = threading.Condition()
+        self.closed = False
+        """No more traces are submitted"""
+        self.stopped = False
+        """The dispatch thread exits"""
+        self.thread = threading.Thread(
+            target=self.dispatch, name="algonim-trace-pool", daemon=True
+        )
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(
+        self,
+        filepath,
+        watched_vars: set[str],
+        max_steps: int | None = None,
+        sample_every: int = 1,
+        cache: bool = True,
+        log_ops: bool = False,
+        calls: bool = False,
+        max_depth: int | None = None,
+    ) -> RemoteTrace:
+        filepath = pathlib.Path(filepath)
+        options = {"log_ops": log_ops, "calls": calls, "max_depth": max_depth}
+        job = RemoteTrace(filepath, watched_vars, max_steps, sample_every, options)
+        # Traces cut short are never stored, a cached one would be too long
+        if cache and max_steps is None:
+            source = filepath.read_text()
+            job.key = cache_key(
+                source, watched_vars, sample_every, log_ops, calls, max_depth
+            )
+            cached = load_trace(job.key)
+            if isinstance(cached, Trace):
+                job.trace = cached
+                job.done = True
+                return job
+
+        with self.has_work:
+            if self.closed:
+                raise RuntimeError("TracePool is closed")
+            self.pending.append(job)
+            self.start_pending()
+            self.has_work.notify()
+        return job
+
+    def start_pending(self):
+        while self.pending and len(self.running) < self.processes:
+            job = self.pending.popleft()
+            conn, child_conn = self.context.Pipe(duplex=False)
+            job.process = self.context.Process(
+                target=run_worker,
+                args=(
+                    child_conn,
+                    str(job.filepath),
+                    job.watched_vars,
+                    job.max_steps,
+                    self.timeout,
+                    job.sample_every,
+                    job.options,
+                    self.memory_limit,
+                ),
+                name=f"algonim-trace-{job.filepath.name}",
+                daemon=True,
+            )
+            job.process.start()
+            # Only the worker holds the sending end, so its exit reads as EOF
+            child_conn.close()
+            job.conn = conn
+            if self.timeout is not None:
+                job.kill_at = time.monotonic() + self.timeout + KILL_GRACE
+            self.running[conn] = job
+
+    def retire(self, job: RemoteTrace, **outcome):
+        assert job.conn is not None and job.process is not None
+        with self.has_work:
+            del self.running[job.conn]
+            if not self.stopped:
+                self.start_pending()
+            self.has_work.notify_all()
+        job.conn.close()
+        job.process.join()
+        job.finish(**outcome)
+
+    def dispatch(self):
+        """Moves steps from the workers into their traces, on a thread"""
+        while True:
+            with self.has_work:
+                while not self.running and not self.stopped:
+                    self.has_work.wait()
+                if self.stopped:
+                    return
+                conns = list(self.running)
+
+            for conn in wait(conns, timeout=0.1):
+                job = self.running[conn]
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    assert job.process is not None
+                    job.process.join()
+                    code = job.process.exitcode
+                    self.retire(job, error=f"Worker exited with code {code}")
+                    continue
+                if message[0] == "steps":
+                    job.add_steps(message[1])
+                else:
+                    _, error, stop_reason = message
+                    self.retire(job, error=error, stop_reason=stop_reason)
+
+            now = time.monotonic()
+            for job in list(self.running.values()):
+                if now > job.kill_at:
+                    assert job.process is not None
+                    job.process.kill()
+                    self.retire(job, stop_reason=f"timeout of {self.timeout}s, killed")
+
+    def close(self, kill: bool = False):
+        """Wait for the submitted traces to finish, then stop the pool
+
+        With `kill`, the workers still running are killed instead and traces
+        not started yet fail.
+        """
+        with self.has_work:
+            self.closed = True
+            pending = []
+            if kill:
+                pending = list(self.pending)
+                self.pending.clear()
+            else:
+                while self.pending or self.running:
+                    self.has_work.wait()
+            self.stopped = True
+            self.has_work.notify_all()
+        self.thread.join()
+
+        for job in pending:
+            job.finish(error="TracePool closed before the trace started")
+        for job in list(self.running.values()):
+            assert job.process is not None
+            job.process.kill()
+            self.retire(job, stop_reason="TracePool closed")
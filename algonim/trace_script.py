@@ -0,0 +1,250 @@
+"""Scripts that play a trace back, with long loops summarized
+
+Every step of a trace moves the code cursor to its line and updates the
+variables that changed. Played like that, a script grows with the trace:
+a loop of a hundred iterations runs for minutes. `compile_trace` plays the
+first and last iterations of a loop in full, fast-forwards the ones in
+between, or skips them with a counter when even that takes too long.
+"""
+
+from dataclasses import dataclass
+from enum import Enum
+
+from algonim.primitives.hcode import HighlightedCode
+from algonim.primitives.var import Var
+from algonim.python_tracer import Snapshot, Trace
+from algonim.script import Action, Script, wait
+
+
+@dataclass
+class Pacing:
+    """How a trace is played, durations are in seconds"""
+
+    step: float = 1.0
+    """A step played in full is shown this long, once the cursor moved"""
+    cursor: float = 0.5
+    """Cursor moves to the line of a step played in full"""
+    fast_step: float = 0.1
+    """A fast-forwarded step, the cursor jumps"""
+    full_iterations: int = 2
+    """Iterations played in full at the start of a loop"""
+    last_iterations: int = 1
+    """Iterations played in full at the end of a loop"""
+    max_fast_forward: float = 3.0
+    """Middle iterations that would take longer are skipped"""
+
+
+class Play(Enum):
+    FULL = "full"
+    FAST = "fast"
+    SKIP = "skip"
+    """Jump to the step, after skipping iterations"""
+
+
+class LoopFinder:
+    """Finds loops in a trace from the line numbers of its steps
+
+    A loop starts at its header, the `for` or `while` line, and every line
+    of its body comes after it. An iteration is a run of steps from one
+    visit of the header to the next, in the same call, with only body lines
+    in between. Headers are the lines the trace jumps back to.
+
+    Calls tell a loop from a call to a function defined above it, so the
+    trace must be recorded with `calls=True`.
+    """
+
+    def __init__(self, trace: Trace):
+        if len(trace.call_ids) != len(trace):
+            raise ValueError("Loops are found per call, trace with calls=True")
+        self.linenos = trace.linenos
+        self.frames = list(trace.call_ids)
+
+        self.next_visit = [len(trace)] * len(trace)
+        """Next step at the same line, in the same call"""
+        seen: dict[tuple[int, int], int] = {}
+        for step in reversed(range(len(trace))):
+            key = (self.linenos[step], self.frames[step])
+            self.next_visit[step] = seen.get(key, len(trace))
+            seen[key] = step
+
+        self.headers: set[tuple[int, int]] = set()
+        previous: dict[int, int] = {}
+        """Line of the previous step of each call"""
+        for lineno, frame in zip(self.linenos, self.frames, strict=True):
+            if previous.get(frame, 0) >= lineno:
+                self.headers.add((lineno, frame))
+            previous[frame] = lineno
+
+    def iterations(self, start: int, stop: int) -> list[range]:
+        """Iterations of the loop with its header at `start`, if any
+
+        The steps from the last visit of the header on, the loop's exit, are
+        not part of any iteration.
+        """
+        header = self.linenos[start]
+        frame = self.frames[start]
+        if (header, frame) not in self.headers:
+            return []
+        iterations = []
+        begin = start
+        while (end := self.next_visit[begin]) < stop and self.in_body(begin, end):
+            iterations.append(range(begin, end))
+            begin = end
+        return iterations
+
+    def in_body(self, begin: int, end: int) -> bool:
+        header = self.linenos[begin]
+        frame = self.frames[begin]
+        for step in range(begin + 1, end):
+            # Steps in calls made from the body count as the body
+            if self.frames[step] == frame and self.linenos[step] < header:
+                return False
+        return True
+
+
+NO_SKIP = "none"
+"""Counter text while no loop has iterations skipped"""
+
+
+class TraceCompiler:
+    """Plans how each step of a trace is played, see `Pacing`"""
+
+    def __init__(self, trace: Trace, pacing: Pacing):
+        self.pacing = pacing
+        self.loops = LoopFinder(trace)
+        self.plan: list[tuple[int, Play, str | None]] = []
+        """Steps to show, how, and the new text of the skip counter, if any"""
+        self.clear_counter = False
+        """Set when a loop with skipped iterations ended"""
+        self.counter = NO_SKIP
+
+    def compile(self, steps: range) -> list[tuple[int, Play, str | None]]:
+        self.add_steps(steps, Play.FULL)
+        return self.plan
+
+    def add(self, step: int, play: Play, counter: str | None = None):
+        if counter is None and self.clear_counter and self.counter != NO_SKIP:
+            counter = NO_SKIP
+        self.clear_counter = False
+        if counter is not None:
+            self.counter = counter
+        self.plan.append((step, play, counter))
+
+    def add_steps(self, steps: range, play: Play):
+        if play is Play.FAST:
+            for step in steps:
+                self.add(step, play)
+            return
+        step = steps.start
+        while step < steps.stop:
+            iterations = self.loops.iterations(step, steps.stop)
+            first = self.pacing.full_iterations
+            last = len(iterations) - self.pacing.last_iterations
+            if first >= last:
+                self.add(step, play)
+                step += 1
+                continue
+            for iteration in iterations[:first]:
+                self.add_steps(iteration, play)
+            skipped = self.add_middle(iterations[first:last])
+            for iteration in iterations[last:]:
+                self.add_steps(iteration, play)
+            # The counter speaks of this loop until it is over
+            self.clear_counter |= skipped
+            step = iterations[-1].stop
+
+    def add_middle(self, iterations: list[range]) -> bool:
+        """Returns True if the iterations are skipped"""
+        steps = range(iterations[0].start, iterations[-1].stop)
+        if len(steps) * self.pacing.fast_step <= self.pacing.max_fast_forward:
+            self.add_steps(steps, Play.FAST)
+            return False
+        # Shown as the state at the end of the skipped iterations
+        header = self.loops.linenos[steps.start]
+        counter = f"{len(iterations)} iterations of line {header}"
+        self.add(steps.stop - 1, Play.SKIP, counter)
+        return True
+
+
+class TracePlayer:
+    """Adds the actions that show steps to `script`
+
+    Waits in a row are merged into one, and steps that change nothing on
+    screen add no actions, only time.
+    """
+
+    def __init__(
+        self,
+        script: Script,
+        code: HighlightedCode,
+        variables: dict[str, Var],
+        pacing: Pacing,
+        skipped: Var | None = None,
+    ):
+        self.script = script
+        self.code = code
+        self.variables = variables
+        self.pacing = pacing
+        self.skipped = skipped
+        self.shown = Snapshot({}, "", -1)
+        self.waiting = 0.0
+
+    def do(self, *actions: Action):
+        if not actions:
+            return
+        if self.waiting:
+            self.script.do(wait(self.waiting))
+            self.waiting = 0.0
+        self.script.do(*actions)
+
+    def show(self, lineno: int, snapshot: Snapshot, play: Play, counter: str | None):
+        if counter is not None and self.skipped is not None:
+            self.do(self.skipped.update_val(counter))
+
+        fast = play is Play.FAST
+        if lineno != self.shown.lineno:
+            cursor = 0.0 if fast else self.pacing.cursor
+            self.do(self.code.hl(lineno, snapshot.line, cursor))
+        new_vars, changed = snapshot.diff(self.shown)
+        self.do(
+            *(
+                self.variables[name].update_val(snapshot.vars[name])
+                for name in sorted(new_vars | changed.keys())
+                if name in self.variables
+            )
+        )
+        self.waiting += self.pacing.fast_step if fast else self.pacing.step
+        self.shown = snapshot
+
+    def finish(self):
+        """Add the wait after the last step"""
+        if self.waiting:
+            self.script.do(wait(self.waiting))
+            self.waiting = 0.0
+
+
+def compile_trace(
+    trace: Trace,
+    code: HighlightedCode,
+    variables: dict[str, Var],
+    pacing: Pacing | None = None,
+    skipped: Var | None = None,
+    script: Script | None = None,
+) -> Script:
+    """Script that plays `trace` on `code` and `variables`, see `Pacing`
+
+    `trace` must be recorded with `calls=True`, see `LoopFinder`. Variables
+    without a `Var` are not shown. `skipped` counts the iterations a skip
+    jumps over, and names the line of their loop, until the loop is over.
+    Actions are added to `script`, a new one by default, which must have
+    `code` and the variables registered.
+    """
+    pacing = pacing or Pacing()
+    script = script or Script()
+    plan = TraceCompiler(trace, pacing).compile(range(len(trace)))
+    player = TracePlayer(script, code, variables, pacing, skipped)
+    shown = trace.follow(step for step, _, _ in plan)
+    for (lineno, snapshot), (_, play, counter) in zip(shown, plan, strict=True):
+        player.show(lineno, snapshot, play, counter)
+    player.finish()
+    return script
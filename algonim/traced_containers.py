@@ -0,0 +1,278 @@
+"""Lists and dicts that log their element operations, for `log_ops` traces
+
+The traced program is rewritten so its list and dict displays,
+comprehensions and `list()`/`dict()` calls build these instead. They behave
+like the builtins, they are subclasses, and while `log` is set every
+element read and write appends an `Op` to it. Operations on many elements
+at once, like `sort` or a slice assignment, log an op with no index: the
+tracer compares the whole container for those.
+"""
+
+import ast
+from collections.abc import Iterable
+from typing import Any, NamedTuple, Self, SupportsIndex
+
+LIST_CONSTRUCTOR = "__algonim_list__"
+DICT_CONSTRUCTOR = "__algonim_dict__"
+
+
+class Op(NamedTuple):
+    """Element operation on a container
+
+    `kind` is "get", "set", "append", "insert", "pop" or "swap", `index` is
+    a dict's key. Reads have `old` equal to `new`, a pop's `new` and an
+    insert's `old` are None, setting a new key of a dict is an insert. A
+    swap's `index`, `old` and `new` are pairs, one item per cell.
+    """
+
+    kind: str
+    index: Any
+    old: Any = None
+    new: Any = None
+
+
+ELEMENT_KINDS = frozenset({"get", "set", "append", "insert", "pop"})
+"""Kinds of ops that touch one element, the others touch them all"""
+
+
+def list_index(container: list, i: int) -> int:
+    return i + len(container) if i < 0 else i
+
+
+class TracedList(list):
+    __slots__ = ("log",)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.log: list[Op] | None = None
+
+    def __getitem__(self, i):
+        value = super().__getitem__(i)
+        if self.log is not None and type(i) is int:
+            i = list_index(self, i)
+            self.log.append(Op("get", i, value, value))
+        return value
+
+    def __setitem__(self, i, value):
+        if self.log is None:
+            return super().__setitem__(i, value)
+        if type(i) is not int:
+            super().__setitem__(i, value)
+            self.log.append(Op("set_slice", None))
+            return None
+        i = list_index(self, i)
+        old = super().__getitem__(i)
+        super().__setitem__(i, value)
+        self.log.append(Op("set", i, old, value))
+        return None
+
+    def __delitem__(self, i):
+        if self.log is None:
+            return super().__delitem__(i)
+        if type(i) is not int:
+            super().__delitem__(i)
+            self.log.append(Op("del_slice", None))
+            return None
+        self.pop(i)
+        return None
+
+    def append(self, value):
+        super().append(value)
+        if self.log is not None:
+            self.log.append(Op("append", len(self) - 1, None, value))
+
+    def extend(self, values):
+        if self.log is None:
+            return super().extend(values)
+        for value in list(values):
+            self.append(value)
+        return None
+
+    def __iadd__(self, values: Iterable[Any]) -> Self:  # type: ignore[misc]
+        self.extend(values)
+        return self
+
+    def insert(self, i, value):
+        # Clamped like list.insert
+        i = min(max(list_index(self, i), 0), len(self))
+        super().insert(i, value)
+        if self.log is not None:
+            self.log.append(Op("insert", i, None, value))
+
+    def pop(self, i=-1):
+        if self.log is None:
+            return super().pop(i)
+        i = list_index(self, i)
+        value = super().pop(i)
+        self.log.append(Op("pop", i, value, None))
+        return value
+
+    def remove(self, value):
+        self.pop(self.index(value))
+
+    def clear(self):
+        super().clear()
+        if self.log is not None:
+            self.log.append(Op("clear", None))
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        if self.log is not None:
+            self.log.append(Op("sort", None))
+
+    def reverse(self):
+        super().reverse()
+        if self.log is not None:
+            self.log.append(Op("reverse", None))
+
+    def __imul__(self, n: SupportsIndex) -> Self:
+        super().__imul__(n)
+        if self.log is not None:
+            self.log.append(Op("repeat", None))
+        return self
+
+    def __reduce__(self):
+        # Copies and pickles, like the values of snapshots, are plain lists
+        return list, (list(self),)
+
+
+class TracedDict(dict):
+    __slots__ = ("log",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.log: list[Op] | None = None
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if self.log is not None:
+            self.log.append(Op("get", key, value, value))
+        return value
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        return self[key]
+
+    def __setitem__(self, key, value):
+        if self.log is None:
+            return super().__setitem__(key, value)
+        old = super().get(key)
+        added = key not in self
+        super().__setitem__(key, value)
+        if added:
+            self.log.append(Op("insert", key, None, value))
+        else:
+            self.log.append(Op("set", key, old, value))
+        return None
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super().pop(key, *default)
+        value = super().pop(key)
+        if self.log is not None:
+            self.log.append(Op("pop", key, value, None))
+        return value
+
+    def popitem(self):
+        key, value = super().popitem()
+        if self.log is not None:
+            self.log.append(Op("pop", key, value, None))
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        if self.log is None:
+            return super().update(*args, **kwargs)
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+        return None
+
+    def __ior__(self, other: Any) -> Self:  # type: ignore[misc]
+        self.update(other)
+        return self
+
+    def clear(self):
+        super().clear()
+        if self.log is not None:
+            self.log.append(Op("clear", None))
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+CONSTRUCTORS = {LIST_CONSTRUCTOR: TracedList, DICT_CONSTRUCTOR: TracedDict}
+"""Globals the rewritten program needs"""
+
+
+def coalesce_swaps(ops: list[Op]) -> list[Op]:
+    """Merge two writes that exchange the values of two cells into a swap
+
+    Like the writes of `a[i], a[j] = a[j], a[i]`.
+    """
+    merged: list[Op] = []
+    for op in ops:
+        last = merged[-1] if merged else None
+        if (
+            op.kind == "set"
+            and last is not None
+            and last.kind == "set"
+            and last.index != op.index
+            and last.old == op.new
+            and last.new == op.old
+        ):
+            merged[-1] = Op(
+                "swap", (last.index, op.index), (last.old, op.old), (last.new, op.new)
+            )
+        else:
+            merged.append(op)
+    return merged
+
+
+class Instrument(ast.NodeTransformer):
+    """Wraps everything that builds a new list or dict in a traced one"""
+
+    def wrap(self, node: ast.expr, constructor: str) -> ast.expr:
+        call = ast.Call(ast.Name(constructor, ast.Load()), [node], [])
+        return ast.copy_location(call, node)
+
+    def visit_List(self, node: ast.List) -> ast.expr:
+        self.generic_visit(node)
+        # Targets like `[a, b] = pair` build nothing
+        if not isinstance(node.ctx, ast.Load):
+            return node
+        return self.wrap(node, LIST_CONSTRUCTOR)
+
+    def visit_ListComp(self, node: ast.ListComp) -> ast.expr:
+        self.generic_visit(node)
+        return self.wrap(node, LIST_CONSTRUCTOR)
+
+    def visit_Dict(self, node: ast.Dict) -> ast.expr:
+        self.generic_visit(node)
+        return self.wrap(node, DICT_CONSTRUCTOR)
+
+    def visit_DictComp(self, node: ast.DictComp) -> ast.expr:
+        self.generic_visit(node)
+        return self.wrap(node, DICT_CONSTRUCTOR)
+
+    def visit_Call(self, node: ast.Call) -> ast.expr:
+        self.generic_visit(node)
+        if isinstance(node.func, ast.Name) and node.func.id == "list":
+            return self.wrap(node, LIST_CONSTRUCTOR)
+        if isinstance(node.func, ast.Name) and node.func.id == "dict":
+            return self.wrap(node, DICT_CONSTRUCTOR)
+        return node
+
+
+def instrument(source: str, filename: str):
+    """`source` compiled with every new list and dict traced"""
+    tree = Instrument().visit(ast.parse(source, filename))
+    ast.fix_missing_locations(tree)
+    return compile(tree, filename, "exec")
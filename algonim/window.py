@@ -5,6 +5,17 @@ from pyglet.gl import Config  # pyright: ignore[reportPrivateImportUsage]
 from pyglet.window import key
 
 
+class Layer(pyglet.graphics.Group):
+    """Z-layer of a window, higher orders are drawn on top
+
+    Keeps the window, so groups below it can change the view matrix.
+    """
+
+    def __init__(self, window: pyglet.window.Window, order: int):
+        super().__init__(order=order)
+        self.window = window
+
+
 class AppWindow(pyglet.window.Window):
     def __init__(self, visible: bool, double_buffer: bool):
         super().__init__(
@@ -15,14 +26,31 @@ class AppWindow(pyglet.window.Window):
             visible=visible,
             config=Config(double_buffer=double_buffer),  # type: ignore[abstract]
         )
+        # Actors that can `attach` draw through one shared batch, so a frame
+        # costs a few draw calls no matter how many shapes and labels exist
+        self.batch = pyglet.graphics.Batch()
+        self.layers: dict[int, Layer] = {}
         # TODO: improve typing later
         self.objects: list[Any] = []
 
+    def layer(self, order: int) -> Layer:
+        if order not in self.layers:
+            self.layers[order] = Layer(self, order)
+        return self.layers[order]
+
+    def add(self, actor, layer: int = 0):
+        if hasattr(actor, "attach"):
+            actor.attach(self.batch, self.layer(layer))
+        else:
+            # Fallback for actors that only know how to draw themselves
+            self.objects.append(actor)
+
     def update(self, delta: float):
         print(delta)
 
     def on_draw(self):
         self.clear()
+        self.batch.draw()
         for object in self.objects:
             object.draw()
 
@@ -0,0 +1,14 @@
+import pytest
+
+from algonim.headless import has_display, use_headless
+
+# Scripts create labels and shapes, which need a GL context. CI containers
+# have no display server, so render through EGL there.
+if not has_display():
+    use_headless()
+
+
+@pytest.fixture(autouse=True)
+def trace_cache_dir(tmp_path, monkeypatch):
+    """Traces cached by tests never reach the user's cache, or come from it"""
+    monkeypatch.setenv("ALGONIM_CACHE_DIR", str(tmp_path / "cache"))
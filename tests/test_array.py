@@ -0,0 +1,62 @@
+import pytest
+
+from algonim.colors import HIGHLIGHT, TRANSPARENT
+from algonim.primitives.array import RECT_VERTICES, Array
+from algonim.traced_containers import Op
+from algonim.window import AppWindow
+
+
+def test_cell_operations_rewrite_only_their_cells():
+    window = AppWindow(visible=False, double_buffer=False)
+    arr = Array(500, 300, [4, 1, 2, 5])
+    window.add(arr)
+    assert arr.digits is not None and arr.grid is not None
+    digits = list(arr.digits.position)
+
+    arr.swap(0, 3)
+    assert arr.data == [5, 1, 2, 4]
+    quad = arr.slots * 4 * 3
+    assert list(arr.digits.position)[quad : 3 * quad] == digits[quad : 3 * quad]
+    assert list(arr.digits.position) != digits
+
+    arr.highlight(1, 3)
+    colors = list(arr.grid.colors)
+    assert colors[4 * RECT_VERTICES : 12 * RECT_VERTICES] == list(HIGHLIGHT) * 12
+    assert colors[: 4 * RECT_VERTICES] == list(TRANSPARENT) * RECT_VERTICES
+
+    # A longer value than any so far makes room for more glyphs per cell
+    arr.set_value(2, 1234)
+    assert arr.slots == 4
+    assert arr.digits.count == 4 * 4 * 4
+
+    # Only integers have glyphs
+    for value in (1.5, None, "7", True):
+        with pytest.raises(ValueError):
+            arr.set_value(0, value)
+    with pytest.raises(ValueError):
+        Array(0, 0, [1, 2.0])
+    window.close()
+
+
+def test_animate_op_touches_only_the_cells_of_the_op():
+    window = AppWindow(visible=False, double_buffer=False)
+    arr = Array(500, 300, [4, 1, 2, 5])
+    window.add(arr)
+    assert arr.digits is not None
+
+    swap = arr.animate_op(Op("swap", (0, 1), (4, 1), (1, 4)), duration=1.0)
+    swap.update(0.5)
+    translation = list(arr.digits.translation)
+    quad = arr.slots * 4 * 3
+    assert translation[0] > 0 and translation[quad] < 0
+    assert translation[2 * quad :] == [0] * (2 * quad)
+    assert arr.data == [4, 1, 2, 5]
+    swap.update(1.0)
+    assert arr.data == [1, 4, 2, 5]
+    assert list(arr.digits.translation) == [0] * (4 * quad)
+
+    arr.animate_op(Op("append", 4, None, 7)).update(0.0)
+    assert arr.data == [1, 4, 2, 5, 7]
+    assert arr.cell_colors[4] == HIGHLIGHT
+    assert arr.digits.count == 5 * arr.slots * 4
+    window.close()
@@ -0,0 +1,34 @@
+from algonim.colors import HIGHLIGHT
+from algonim.primitives.call_stack import CallStack
+from algonim.python_tracer import Call
+from algonim.script import Script, ScriptExecutor
+from algonim.window import AppWindow
+
+
+def fib_calls(depth: int) -> list[Call]:
+    return [Call(i, i - 1, "fib", i + 1, {"n": depth - i}, i) for i in range(depth)]
+
+
+def test_call_stack_shows_the_innermost_frames():
+    window = AppWindow(visible=False, double_buffer=False)
+    stack = CallStack(100, 100, visible=3)
+    window.add(stack)
+    calls = fib_calls(10)
+
+    stack.set_stack(calls)
+    assert [label.text for label in stack.labels] == [
+        "... 7 more",
+        "fib(n=3)",
+        "fib(n=2)",
+        "fib(n=1)",
+    ]
+
+    script = Script()
+    script.do(stack.update(calls[:8], [(calls[9], 1), (calls[8], 1)], 1.0))
+    executor = ScriptExecutor(script)
+    executor.seek(0.5)
+    assert stack.labels[-1].text == "fib(n=1) → 1"
+    assert stack.labels[-1].color == HIGHLIGHT
+    executor.seek(1.0)
+    assert stack.labels[-1].text == "fib(n=3)"
+    window.close()
@@ -0,0 +1,42 @@
+import pyglet
+import pytest
+from pyglet import gl
+
+from algonim.framebuffer import OffscreenTarget
+from algonim.readback import read_pixels
+from algonim.window import AppWindow
+
+
+def edge_levels(window: AppWindow, supersample: int) -> set[int]:
+    """Red levels of a white triangle drawn over black"""
+    width, height = 64, 36
+    batch = pyglet.graphics.Batch()
+    triangle = pyglet.shapes.Triangle(
+        10, 10, window.width - 10, 50, 200, window.height - 10, batch=batch
+    )
+    target = OffscreenTarget(width, height, supersample)
+    target.bind()
+    gl.glClearColor(0, 0, 0, 1)
+    gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+    batch.draw()
+    target.resolve()
+    frame = bytearray(width * height * 4)
+    read_pixels(width, height, frame)
+    target.unbind()
+    target.delete()
+    triangle.delete()
+    return set(frame[::4])
+
+
+def test_supersampling_averages_every_sample():
+    window = AppWindow(visible=False, double_buffer=False)
+    window.switch_to()
+    levels = {n: len(edge_levels(window, n)) for n in (1, 2, 4)}
+    # 2x2 samples give 5 coverage levels, 4x4 up to 17
+    assert levels[1] == 2
+    assert levels[2] == 5
+    assert levels[4] > 5
+
+    with pytest.raises(ValueError):
+        OffscreenTarget(64, 36, 3)
+    window.close()
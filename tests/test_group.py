@@ -0,0 +1,38 @@
+import pytest
+from pyglet.math import Vec4
+
+from algonim.primitives.array import Array
+from algonim.window import AppWindow
+
+
+def test_moving_a_group_only_changes_its_transform():
+    window = AppWindow(visible=False, double_buffer=False)
+    arr = Array(500, 300, [1, 2, 3])
+    window.add(arr)
+    assert arr.grid is not None
+    grid = list(arr.grid.position)
+
+    arr.set_x(700)
+    arr.set_rotation(90)
+    arr.set_scale(2)
+
+    assert list(arr.grid.position) == grid
+    assert arr.transform is not None
+    point = arr.transform.matrix @ Vec4(10, 0, 0, 1)
+    assert point.x == pytest.approx(700)
+    assert point.y == pytest.approx(320)
+    window.close()
+
+
+def test_fully_transparent_group_is_not_drawn():
+    window = AppWindow(visible=False, double_buffer=False)
+    arr = Array(500, 300, [1, 2, 3])
+    window.add(arr)
+    assert arr.transform is not None
+    assert not arr.transform.visible
+
+    arr.set_alpha(51)
+    assert arr.transform.visible
+    assert arr.transform.opacity == pytest.approx(0.2)
+    assert arr.color[3] == 255
+    window.close()
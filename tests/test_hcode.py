@@ -0,0 +1,29 @@
+from algonim.primitives.hcode import CACHED_LINES, HighlightedCode
+from algonim.window import AppWindow
+
+SOURCE = "".join(f"x{i} = {i}\n" for i in range(300))
+
+
+def test_only_lines_near_the_window_are_laid_out():
+    window = AppWindow(visible=False, double_buffer=False)
+    code = HighlightedCode(SOURCE, 200, 0, 28)
+    window.add(code)
+
+    # Scrolled so the first line is on screen, 1080 / 44 = 25 lines fit
+    assert code.view.start == 0
+    assert len(code.view) < 40
+    assert len(code.rows) == len(code.view)
+
+    hl = code.hl(250, "")
+    hl.begin()
+    hl.update(hl.duration)
+    assert 250 in code.view
+    assert 0 < code.y + code.line_y[250] + code.scroll < window.height
+    assert len(code.rows) <= len(code.view) + CACHED_LINES
+
+    # Scrolling back shows the hidden layouts of the first lines again
+    first_row = code.rows[0]
+    code.set_scroll(code.scroll_for(0))
+    assert code.rows[0] is first_row
+    assert all(layout.visible for layout in first_row)
+    window.close()
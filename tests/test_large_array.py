@@ -0,0 +1,24 @@
+import numpy as np
+
+from algonim.primitives.large_array import QUAD_VERTICES, LargeArray
+from algonim.window import AppWindow
+
+
+def test_only_cells_inside_the_window_are_uploaded():
+    window = AppWindow(visible=False, double_buffer=False)
+    chart = LargeArray(960, 540, np.arange(10_000), width=1600)
+    window.add(chart)
+    assert chart.view == range(10_000)
+
+    # 1920 / 20 = 96px of the 1600px chart are on screen, 6% of the cells
+    chart.set_scale(20)
+    assert chart.view == range(4700, 5300)
+
+    chart.set_values([-1.0, -2.0], start=4700)
+    assert chart.bars is not None
+    values = list(chart.bars.value)
+    assert (
+        values[: 2 * QUAD_VERTICES] == [-1.0] * QUAD_VERTICES + [-2.0] * QUAD_VERTICES
+    )
+    assert values[2 * QUAD_VERTICES : 3 * QUAD_VERTICES] == [4702.0] * QUAD_VERTICES
+    window.close()
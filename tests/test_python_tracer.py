@@ -0,0 +1,291 @@
+import gc
+import pathlib
+import sys
+import time
+from itertools import pairwise
+
+import pytest
+
+from algonim.python_tracer import (
+    TOOL_IDS,
+    Changed,
+    ListEdit,
+    MonitoringTracer,
+    Snapshot,
+    Trace,
+    Tracer,
+    iter_trace,
+    trace,
+)
+from algonim.traced_containers import Op
+
+PROGRAM = """\
+def find_max(array):
+    largest = array[0]
+    for i in range(1, len(array)):
+        if array[i] > largest:
+            largest = array[i]
+    return largest
+
+
+arr = [4, 3, 1, 7, 20, 7, 5]
+largest = find_max(arr)
+total = sum(x * 2 for x in arr)
+while total > 0:
+    total -= 50
+"""
+
+
+def test_monitoring_tracer_matches_settrace(tmp_path: pathlib.Path):
+    program = tmp_path / "program.py"
+    program.write_text(PROGRAM)
+    watched = {"arr", "array", "largest", "i", "x", "total"}
+
+    expected = list(Tracer(program, watched).run())
+    assert list(MonitoringTracer(program, watched).run()) == expected
+    # The tool id is released, a second trace can claim it
+    assert list(MonitoringTracer(program, watched).run()) == expected
+
+
+def test_trace_stores_element_edits_and_rebuilds_any_step():
+    trace = Trace()
+    arr = list(range(1000))
+    states = []
+    for i in range(600):
+        arr[i * 7 % 1000] = -i
+        states.append({"arr": list(arr), "i": i} if i else {"arr": list(arr)})
+        trace.record(3, "arr[j] = -i", states[-1])
+
+    delta = trace.deltas[5]
+    assert delta is not None
+    assert delta["arr"] == ListEdit(1000, {35: -5})
+    assert len(trace.keyframes) < 10
+    assert [snapshot.vars for _, snapshot in trace] == states
+    assert trace[457][1].vars == states[457]
+
+    _, first = trace[0]
+    _, second = trace[1]
+    assert first.diff(Snapshot({}, "", -1)) == ({"arr"}, {})
+    new_vars, changed = second.diff(first)
+    assert new_vars == {"i"}
+    assert changed["arr"].to[7] == -1
+
+    # Rebinds to an equal value of another type are not changes
+    trace = Trace()
+    for state in ({"x": 1, "flag": True}, {"x": 1.0, "flag": 1}, {"x": 2, "flag": 1}):
+        trace.record(1, "x = ...", state)
+    _, first = trace[0]
+    _, second = trace[1]
+    _, third = trace[2]
+    assert trace.deltas[1]
+    assert second.diff(first) == (set(), {})
+    assert third.diff(second) == (set(), {"x": Changed(1.0, 2)})
+
+
+def test_log_ops_records_element_operations(tmp_path: pathlib.Path):
+    program = tmp_path / "program.py"
+    program.write_text(
+        "arr = [3, 1, 2]\n"
+        "seen = {0: False}\n"
+        "arr[0], arr[1] = arr[1], arr[0]\n"
+        "arr.append(4)\n"
+        "seen[arr[2]] = True\n"
+        "arr.sort(reverse=True)\n"
+        "arr = None\n"
+    )
+    watched = {"arr", "seen"}
+
+    expected = list(trace(program, watched, cache=False))
+    result = trace(program, watched, cache=False, log_ops=True)
+    assert list(result) == expected
+
+    ops = [snapshot.ops for _, snapshot in result]
+    assert ops[3]["arr"][-1] == Op("swap", (0, 1), (3, 1), (1, 3))
+    assert ops[4] == {"arr": (Op("append", 3, None, 4),)}
+    assert ops[5] == {
+        "arr": (Op("get", 2, 2, 2),),
+        "seen": (Op("insert", 2, None, True),),
+    }
+    delta = result.deltas[4]
+    assert delta is not None and delta["arr"] == ListEdit(4, {3: 4})
+    # A sort touches every element, it is compared as a whole
+    assert "arr" not in ops[6]
+
+
+def test_calls_record_the_stack_and_return_values(tmp_path: pathlib.Path):
+    program = tmp_path / "program.py"
+    program.write_text(
+        "def fib(n):\n"
+        "    if n < 2:\n"
+        "        return n\n"
+        "    return fib(n - 1) + fib(n - 2)\n"
+        "\n"
+        "result = fib(4)\n"
+        "done = True\n"
+    )
+    watched = {"n", "result"}
+
+    expected = list(trace(program, watched, cache=False))
+    result = trace(program, watched, cache=False, calls=True)
+    assert list(result) == expected
+    assert len(result.calls) == 9
+
+    # Deepest point, fib(4) -> fib(3) -> fib(2) -> fib(1)
+    step = result.calls[3].step
+    assert [str(call) for call in result[step][1].stack()] == [
+        "fib(n=4)",
+        "fib(n=3)",
+        "fib(n=2)",
+        "fib(n=1)",
+    ]
+    _, last = result[-1]
+    assert last.stack() == []
+    # fib(0) returns, then the fib(2) and fib(4) waiting on it
+    assert [(str(call), value) for call, value in last.returns] == [
+        ("fib(n=0)", 0),
+        ("fib(n=2)", 1),
+        ("fib(n=4)", 3),
+    ]
+
+    limited = trace(program, watched, cache=False, max_depth=2)
+    assert len(limited.calls) == 3
+    assert max(len(limited.stack(step)) for step in range(len(limited))) == 2
+    assert len(limited) < len(result)
+
+
+def test_calls_follow_closed_generators_and_exceptions(tmp_path: pathlib.Path):
+    program = tmp_path / "program.py"
+    program.write_text(
+        "def f(n):\n"
+        "    ok = any(x > 2 for x in range(n))\n"
+        "    return ok\n"
+        "\n"
+        "def fail(n):\n"
+        "    raise ValueError(n)\n"
+        "\n"
+        "def g(k):\n"
+        "    try:\n"
+        "        fail(k)\n"
+        "    except ValueError:\n"
+        "        pass\n"
+        "    return f(k)\n"
+        "\n"
+        "a = g(10)\n"
+        "b = g(5)\n"
+        "done = True\n"
+    )
+    result = trace(program, {"a", "b"}, cache=False, calls=True)
+    stacks = [[call.function for call in snapshot.stack()] for _, snapshot in result]
+    lines = [lineno for lineno, _ in result]
+
+    # The generator `any` closes early, f is still running on line 3
+    assert stacks[lines.index(3)] == ["g", "f"]
+    # fail raised into g, which goes on
+    assert stacks[lines.index(12)] == ["g"]
+    assert stacks[lines.index(16)] == []
+    second = [call for call in result.calls if str(call) == "g(k=5)"]
+    assert len(second) == 1
+    _, last = result[-1]
+    assert [(str(call), value) for call, value in last.returns][-2:] == [
+        ("f(n=5)", True),
+        ("g(k=5)", True),
+    ]
+
+
+def claimed_tool_ids() -> set[int]:
+    return {i for i in TOOL_IDS if sys.monitoring.get_tool(i) == "algonim"}
+
+
+def drain(stream):
+    """Steps of an `iter_trace` stream and its stop reason"""
+    steps = []
+    while True:
+        try:
+            steps.append(next(stream))
+        except StopIteration as stop:
+            return steps, stop.value
+
+
+def test_iter_trace_stops_runaway_programs(tmp_path: pathlib.Path):
+    program = tmp_path / "program.py"
+    program.write_text(
+        "i = 0\nwhile True:\n    try:\n        i += 1\n    except Exception:\n"
+        "        pass\n"
+    )
+
+    steps, stop_reason = drain(iter_trace(program, {"i"}, max_steps=100))
+    assert stop_reason == "max_steps of 100"
+    assert len(steps) == 100
+    assert steps[-1][1].vars == {"i": 32}
+
+    assert len(list(iter_trace(program, {"i"}, timeout=0.1))) > 100
+
+    # Blocked in C code, no line event comes to check the timeout
+    blocked = tmp_path / "blocked.py"
+    blocked.write_text("import time\ni = 1\ntime.sleep(1)\ni = 2\n")
+    started = time.monotonic()
+    steps, stop_reason = drain(iter_trace(blocked, {"i"}, timeout=0.2))
+    assert time.monotonic() - started < 0.8
+    assert [s.vars for _, s in steps] == [{}, {}, {"i": 1}]
+    assert stop_reason == "timeout of 0.2s, abandoned"
+    # The abandoned program still holds its tool id, traces claim another
+    held = claimed_tool_ids()
+    assert len(held) == 1
+    stream = iter_trace(blocked, {"i"}, timeout=0.2, cache=False)
+    next(stream)
+    assert claimed_tool_ids() > held
+    assert len(list(stream)) == 2
+    # An abandoned program never leaves the garbage collector disabled
+    assert gc.isenabled()
+
+    # trace fails instead of passing a cut-off trace for a whole run
+    with pytest.raises(TimeoutError, match="timeout of 0.1s"):
+        trace(program, {"i"}, cache=False, timeout=0.1)
+    with pytest.raises(TimeoutError, match="abandoned"):
+        trace(blocked, {"i"}, cache=False, timeout=0.2)
+    finite = tmp_path / "finite.py"
+    finite.write_text(PROGRAM)
+    assert list(trace(finite, {"arr"}, cache=False, timeout=5)) == list(
+        trace(finite, {"arr"}, cache=False)
+    )
+
+    # Every line of the loop body is sampled on the same iterations
+    sampled = iter_trace(program, {"i"}, max_steps=10, sample_every=10)
+    assert [(lineno, snapshot.vars.get("i")) for lineno, snapshot in sampled][4:] == [
+        (2, 10),
+        (3, 10),
+        (4, 10),
+        (2, 20),
+        (3, 20),
+        (4, 20),
+    ]
+
+
+def test_traces_are_cached_by_program_content(tmp_path: pathlib.Path, monkeypatch):
+    monkeypatch.setenv("ALGONIM_CACHE_DIR", str(tmp_path / "cache"))
+    program = tmp_path / "program.py"
+    program.write_text(PROGRAM)
+    watched = {"arr", "largest", "total"}
+
+    expected = list(trace(program, watched, cache=False))
+    assert list(iter_trace(program, watched)) == expected
+    assert len(list((tmp_path / "cache" / "traces").iterdir())) == 1
+
+    # Served from the cache, the program is not run again
+    program.touch()
+    monkeypatch.setattr(MonitoringTracer, "run", None)
+    assert list(trace(program, watched)) == expected
+    assert drain(iter_trace(program, watched, max_steps=5)) == (
+        expected[:5],
+        "max_steps of 5",
+    )
+    # Diffs read from the cached deltas match comparing the values
+    cached = [snapshot for _, snapshot in iter_trace(program, watched)]
+    compared = [Snapshot(s.vars, s.line, s.lineno) for s in cached]
+    assert [b.diff(a) for a, b in pairwise(cached)] == [
+        b.diff(a) for a, b in pairwise(compared)
+    ]
+
+    program.write_text(PROGRAM + "total = 1\n")
+    with pytest.raises(TypeError):
+        trace(program, watched)
@@ -0,0 +1,149 @@
+import math
+
+import pytest
+
+from algonim.render import RenderSettings, iter_frames
+from algonim.script import (
+    Script,
+    ScriptExecutor,
+    fade_in,
+    instant,
+    move_by,
+    parallel,
+    seq,
+    wait,
+)
+from algonim.time_utils import FrameProfiler
+
+
+class Dummy:
+    def __init__(self):
+        self.x = 0.0
+        self.y = 0.0
+        self.alpha = 0
+
+    def set_x(self, x):
+        self.x = x
+
+    def set_y(self, y):
+        self.y = y
+
+    def set_alpha(self, alpha):
+        self.alpha = alpha
+
+
+def test_duration_is_known_up_front():
+    obj = Dummy()
+    script = Script()
+    script.do(fade_in(obj, duration=1.0))
+    script.do(wait(2.0), seq(wait(0.5), move_by(obj, 10, 0, 3.0)))
+    script.do(instant(lambda: None))
+
+    assert script.duration == pytest.approx(4.5)
+    assert ScriptExecutor(script).frame_count(60) == 271
+
+
+def test_seek_evaluates_absolute_time():
+    obj = Dummy()
+    script = Script()
+    script.do(fade_in(obj, duration=1.0))
+    script.do(move_by(obj, 100, 0, 2.0))
+    script_exec = ScriptExecutor(script)
+
+    script_exec.seek(2.0)
+    assert obj.alpha == 255
+    assert obj.x == pytest.approx(50.0)
+
+    script_exec.seek(10.0)
+    assert obj.x == pytest.approx(100.0)
+    assert script_exec.is_complete()
+
+    with pytest.raises(ValueError):
+        script_exec.seek(1.0)
+
+
+def test_move_by_binds_start_position_late():
+    obj = Dummy()
+    script = Script()
+    script.do(move_by(obj, 10, 0, 1.0))
+    script.do(move_by(obj, 10, 0, 1.0))
+    script_exec = ScriptExecutor(script)
+
+    script_exec.seek(1.5)
+    assert obj.x == pytest.approx(15.0)
+
+
+def test_parallel_takes_longest_duration():
+    calls = []
+    action = parallel(wait(1.0), seq(wait(2.0), instant(lambda: calls.append(1))))
+    assert action.duration == 2.0
+
+    script = Script()
+    script.do(action)
+    script_exec = ScriptExecutor(script)
+    script_exec.seek(1.0)
+    assert calls == []
+    script_exec.seek(2.0)
+    assert calls == [1]
+
+
+def test_zero_duration_steps_share_a_tick():
+    obj = Dummy()
+    calls = []
+    script = Script()
+    for i in range(100):
+        script.do(instant(lambda i=i: calls.append(i)))
+    script.do(fade_in(obj, duration=1.0))
+    script_exec = ScriptExecutor(script)
+
+    assert script_exec.frame_count(60) == 61
+
+    script_exec.execute_current_action(1 / 60)
+    assert calls == list(range(100))
+    assert obj.alpha == int(255 / 60)
+
+
+def test_leftover_time_carries_into_next_step():
+    obj = Dummy()
+    script = Script()
+    script.do(wait(0.25))
+    script.do(instant(lambda: None))
+    script.do(move_by(obj, 100, 0, 1.0))
+    script_exec = ScriptExecutor(script)
+
+    # One 0.5s tick finishes the wait and spends the remaining 0.25s moving
+    script_exec.execute_current_action(0.5)
+    assert obj.x == pytest.approx(25.0)
+
+
+def test_seek_reports_whether_the_screen_changed():
+    obj = Dummy()
+    script = Script()
+    script.do(wait(1.0))
+    script.do(fade_in(obj, duration=1.0))
+    script.do(wait(1.0))
+    script.do(instant(lambda: None))
+    script.do(wait(1.0))
+    script_exec = ScriptExecutor(script)
+
+    # A wrong False here freezes the previous frame in the video
+    times = [0.0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 5.0]
+    assert [script_exec.seek(t) for t in times] == [
+        False,
+        False,
+        True,
+        True,
+        True,
+        False,
+        True,
+        False,
+        False,
+        False,
+    ]
+
+    # The first frame is always drawn, even in the middle of a wait
+    settings = RenderSettings(fps=2, frames=range(1, 6))
+    profiler = FrameProfiler("frames", 5, report_interval=math.inf)
+    changed = list(iter_frames(ScriptExecutor(script), settings, profiler))
+    assert changed == [True, True, True, True, False]
+    assert profiler.reused == 1
@@ -0,0 +1,8 @@
+from algonim.segments import split_frames
+
+
+def test_split_frames_covers_the_range_in_order():
+    assert split_frames(range(10), 3) == [range(0, 3), range(3, 6), range(6, 10)]
+    # A --frames range is split, not the whole script
+    assert split_frames(range(100, 110), 2) == [range(100, 105), range(105, 110)]
+    assert split_frames(range(5, 7), 4) == [range(5, 6), range(6, 7)]
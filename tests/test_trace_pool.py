@@ -0,0 +1,66 @@
+import pathlib
+
+import pytest
+
+from algonim import trace_pool
+from algonim.python_tracer import trace
+from algonim.trace_pool import TracePool
+
+PROGRAM = """\
+arr = [5, 1, 4, 2, 3] * 20
+for i in range(len(arr)):
+    for j in range(len(arr) - i - 1):
+        if arr[j] > arr[j + 1]:
+            arr[j], arr[j + 1] = arr[j + 1], arr[j]
+"""
+
+
+def test_pool_traces_match_in_process_traces(tmp_path: pathlib.Path, monkeypatch):
+    monkeypatch.setenv("ALGONIM_CACHE_DIR", str(tmp_path / "cache"))
+    programs = []
+    for n in range(3):
+        program = tmp_path / f"program{n}.py"
+        program.write_text(PROGRAM.replace("20", str(n + 1)))
+        programs.append(program)
+    watched = {"arr", "i", "j"}
+
+    # Leaving the block waits for the traces, like concurrent.futures
+    with TracePool(processes=2) as pool:
+        jobs = [pool.submit(program, watched) for program in programs]
+    assert all(job.done for job in jobs)
+    results = [list(job) for job in jobs]
+    for program, result in zip(programs, results, strict=True):
+        assert result == list(trace(program, watched, cache=False))
+
+    # Complete traces went to the cache, the second pool starts no process
+    with TracePool() as pool:
+        job = pool.submit(programs[0], watched)
+        assert job.done and job.process is None
+        assert list(job) == results[0]
+
+
+def test_pool_kills_stuck_programs_and_reports_errors(
+    tmp_path: pathlib.Path, monkeypatch
+):
+    monkeypatch.setattr(trace_pool, "KILL_GRACE", 0.2)
+    stuck = tmp_path / "stuck.py"
+    stuck.write_text("import time\nx = 1\ntime.sleep(60)\n")
+    failing = tmp_path / "failing.py"
+    failing.write_text("x = 1\nraise ValueError('boom')\n")
+
+    with TracePool(timeout=0.5) as pool:
+        stuck_job = pool.submit(stuck, {"x"}, cache=False)
+        failing_job = pool.submit(failing, {"x"}, cache=False)
+        assert len(stuck_job.result()) >= 1
+        assert stuck_job.stop_reason is not None
+        assert "killed" in stuck_job.stop_reason
+        with pytest.raises(RuntimeError, match="ValueError: boom"):
+            failing_job.result()
+
+    pool = TracePool(processes=1)
+    running = pool.submit(stuck, {"x"}, cache=False)
+    queued = pool.submit(stuck, {"x"}, cache=False)
+    pool.close(kill=True)
+    assert running.stop_reason == "TracePool closed"
+    with pytest.raises(RuntimeError, match="closed before the trace started"):
+        queued.result()
@@ -0,0 +1,91 @@
+import pathlib
+
+import pytest
+
+from algonim.primitives.hcode import HighlightedCode
+from algonim.primitives.var import Var
+from algonim.python_tracer import trace
+from algonim.script import ScriptExecutor, Wait
+from algonim.trace_script import Pacing, Play, TraceCompiler, compile_trace
+
+PROGRAM = """\
+total = 0
+for i in range(100):
+    if i % 3 == 0:
+        total += i
+done = True
+"""
+
+
+def test_long_loops_are_summarized(tmp_path: pathlib.Path):
+    program = tmp_path / "program.py"
+    program.write_text(PROGRAM)
+    program_trace = trace(program, {"i", "total"}, cache=False, calls=True)
+
+    plan = TraceCompiler(program_trace, Pacing()).compile(range(len(program_trace)))
+    plays = [play for _, play, _ in plan]
+    assert plays.count(Play.SKIP) == 1
+    counters = [counter for _, _, counter in plan if counter is not None]
+    assert counters == ["97 iterations of line 2", "none"]
+    # Two iterations before the skip, one after, then the loop's exit
+    assert len(plan) < 15
+
+    code = HighlightedCode(PROGRAM, 420, 250, 28)
+    variables = {"i": Var(100, 100, "i", "null"), "total": Var(300, 100, "t", "")}
+    skipped = Var(100, 30, "skipped", "none")
+    script = compile_trace(program_trace, code, variables, skipped=skipped)
+    assert script.duration < 30
+    waits = [isinstance(step, Wait) for step in script.steps]
+    assert not any(a and b for a, b in zip(waits, waits[1:], strict=False))
+
+    executor = ScriptExecutor(script)
+    executor.seek(script.duration)
+    assert variables["i"].label.text == "i = 99"
+    assert variables["total"].label.text == f"t = {sum(range(0, 100, 3))}"
+    # Cleared once the loop is over
+    assert skipped.label.text == "skipped = none"
+
+
+def test_skip_counter_names_the_loop_of_nested_loops(tmp_path: pathlib.Path):
+    program = tmp_path / "program.py"
+    program.write_text(
+        "for i in range(20):\n    for j in range(50):\n        x = i * j\ndone = True\n"
+    )
+    program_trace = trace(program, {"i", "j"}, cache=False, calls=True)
+
+    plan = TraceCompiler(program_trace, Pacing()).compile(range(len(program_trace)))
+    counters = [counter for _, _, counter in plan if counter is not None]
+    # Inner loops of the outer iterations played in full, then the outer one
+    inner = "47 iterations of line 2"
+    assert counters == [
+        inner,
+        "none",
+        inner,
+        "none",
+        "17 iterations of line 1",
+        inner,
+        "none",
+    ]
+
+
+def test_loops_calling_functions_defined_above_them(tmp_path: pathlib.Path):
+    program = tmp_path / "program.py"
+    program.write_text(
+        "def sq(v):\n"
+        "    return v * v\n"
+        "\n"
+        "\n"
+        "total = 0\n"
+        "for k in range(100):\n"
+        "    total += sq(k)\n"
+        "done = True\n"
+    )
+    program_trace = trace(program, {"k", "total"}, cache=False, calls=True)
+
+    plan = TraceCompiler(program_trace, Pacing()).compile(range(len(program_trace)))
+    counters = [counter for _, _, counter in plan if counter is not None]
+    assert counters == ["97 iterations of line 6", "none"]
+
+    # Without calls, the helper's line would pass for the loop's header
+    with pytest.raises(ValueError, match="calls=True"):
+        TraceCompiler(trace(program, {"k"}, cache=False), Pacing())
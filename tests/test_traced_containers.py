@@ -0,0 +1,43 @@
+import copy
+import pickle
+
+from algonim.traced_containers import (
+    CONSTRUCTORS,
+    Op,
+    TracedDict,
+    TracedList,
+    coalesce_swaps,
+    instrument,
+)
+
+
+def test_instrumented_program_builds_traced_containers():
+    code = instrument(
+        "a = [1, 2]\n[x, y] = a\nb = {k: 0 for k in a}\nc = list(range(3))\n",
+        "program.py",
+    )
+    namespace = dict(CONSTRUCTORS)
+    exec(code, namespace)
+    assert type(namespace["a"]) is TracedList
+    assert type(namespace["b"]) is TracedDict
+    assert type(namespace["c"]) is TracedList
+    assert (namespace["x"], namespace["y"]) == (1, 2)
+
+
+def test_traced_list_logs_operations_and_copies_plain():
+    arr = TracedList([3, 1, 2])
+    arr.append(0)
+    assert arr.log is None
+
+    arr.log = []
+    arr[-1], arr[0] = arr[0], arr[-1]
+    arr.pop(1)
+    assert coalesce_swaps(arr.log) == [
+        Op("get", 0, 3, 3),
+        Op("get", 3, 0, 0),
+        Op("swap", (3, 0), (0, 3), (3, 0)),
+        Op("pop", 1, 1, None),
+    ]
+    assert arr == [0, 2, 3]
+    assert type(copy.deepcopy(arr)) is list
+    assert type(pickle.loads(pickle.dumps(arr))) is list
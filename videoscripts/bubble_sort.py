@@ -2,8 +2,9 @@ import pathlib
 
 from algonim.primitives.hcode import HighlightedCode
 from algonim.primitives.var import Var
-from algonim.python_tracer import Snapshot, trace
-from algonim.script import Script, wait
+from algonim.python_tracer import trace
+from algonim.script import Script
+from algonim.trace_script import compile_trace
 
 bubble_sort_code = """\
 arr = [3, 1, 3, 4, 6, 9, 5]
@@ -26,37 +27,19 @@ def build_script():
     program_filepath = pathlib.Path("videoprograms/bubble_sort.py")
 
     code = HighlightedCode(program_filepath.open("rt").read(), 420, 250, 28)
-    print(code.layout.content_width, code.layout.content_height)
     script.register(code)
 
-    lines = trace(program_filepath, {"arr", "swapped", "i", "j"})
-
     variables = {
         "i": Var(100, 100, "i", "null"),
         "j": Var(300, 100, "j", "null"),
         "swapped": Var(500, 100, "swapped", "null"),
         "arr": Var(1000, 100, "arr", "null"),
     }
+    skipped = Var(100, 30, "skipped", "none")
 
-    for var in variables.values():
+    for var in (*variables.values(), skipped):
         script.register(var)
 
-    prev_snapshot = Snapshot({}, "", -1)
-    for lineno, snapshot in lines:
-        new_vars, changed = snapshot.diff(prev_snapshot)
-        print(new_vars, changed)
-
-        script.do(code.hl(lineno, snapshot.line))
-        prev_snapshot = snapshot
-
-        for varname in new_vars:
-            value = snapshot.vars[varname]
-            script.do(variables[varname].update_val(value))
-            print(f"NEW VAR {varname} = {value}")
-
-        for varname in changed:
-            script.do(variables[varname].update_val(changed[varname].to))
-
-        script.do(wait(2))
-
-    return script
+    # Bounded, a runaway program fails the build instead of hanging it
+    program_trace = trace(program_filepath, set(variables), calls=True, timeout=10)
+    return compile_trace(program_trace, code, variables, skipped=skipped, script=script)